@@ -32,6 +32,7 @@ from PackageManager import PackageManager
 from StringUtils import StringUtils
 from SpecDeps import SpecDependencyGenerator
 from SpecData import SPECS
+from DependencyIndex import DependencyIndex
 from check_spec import check_specs
 
 
@@ -272,6 +273,12 @@ class Utilities:
             else:
                 self.pkg = os.environ["pkg"]
             self.display_option = "tree"
+            # print_upward_deps takes spec file names, whose spec files
+            # are loaded when asked for
+            if configdict["targetName"] == "print_upward_deps":
+                SPECS.setTargetPackages([])
+            else:
+                SPECS.setTargetPackages([self.pkg])
 
         if configdict["targetName"] == "imgtree" and "img" not in os.environ:
             raise Exception("img not present in os.environ")
@@ -301,20 +308,11 @@ class Utilities:
                 f" {Build_Config.generatedDataPath}"
             )
 
-        for json_file in list_json_files:
-            output_file = None
-            if self.display_option == "json":
-                output_file = os.path.join(
-                    Build_Config.generatedDataPath,
-                    os.path.splitext(os.path.basename(json_file))[0]
-                    + "_expanded.json",
-                )
-                self.specDepsObject.process(
-                    self.input_type,
-                    json_file,
-                    self.display_option,
-                    output_file,
-                )
+        if self.display_option == "json":
+            self.specDepsObject.expandPackageLists(
+                list_json_files, Build_Config.generatedDataPath
+            )
+            for json_file in list_json_files:
                 shutil.copyfile(
                     json_file,
                     os.path.join(
@@ -329,20 +327,18 @@ class Utilities:
             self.input_type, self.pkg, self.display_option
         )
 
+    # answered from the persisted dependency index, which does not need
+    # the spec files to be read while they did not change
     def who_needs(self):
-        self.input_type = "who-needs"
-        self.specDepsObject.process(
-            self.input_type, self.pkg, self.display_option
-        )
+        whoNeedsList = DependencyIndex().getDependents(self.pkg)
+        self.logger.info(whoNeedsList)
 
     def imgtree(self):
         self.input_type = "json"
         self.generate_dep_lists()
 
     def print_upward_deps(self):
-        whoNeedsList = self.specDepsObject.process(
-            "get-upward-deps", self.pkg, self.display_option
-        )
+        whoNeedsList = DependencyIndex().getUpwardDeps(self.pkg)
         self.logger.info("Upward dependencies: " + str(whoNeedsList))
 
     def pull_stage_rpms(self):
@@ -1379,6 +1375,9 @@ def initialize_constants():
         )
     )
     Build_Config.setBuildThreads(configdict["photon-build-param"]["threads"])
+    constants.setSpecParseProcesses(
+        configdict["photon-build-param"].get("spec-parse-processes", 0)
+    )
     Build_Config.setPkgBuildType(
         configdict["photon-build-param"]["photon-build-type"]
     )
@@ -1386,6 +1385,7 @@ def initialize_constants():
         configdict.get("additional-path", {}).get("pkg-json-input", None)
     )
     constants.setLogPath(os.path.join(Build_Config.stagePath, "LOGS"))
+    constants.setBuildCachePath(os.path.join(Build_Config.stagePath, "cache"))
     constants.setLogLevel(configdict["photon-build-param"]["loglevel"])
     constants.setDist(configdict["photon-build-param"]["photon-dist-tag"])
     constants.setBuildNumber(
@@ -1428,6 +1428,9 @@ def initialize_constants():
             "publish-build-dependencies", False
         )
     )
+    constants.setKeepGoing(
+        configdict["photon-build-param"].get("keep-going", False)
+    )
     constants.setRpmPath(os.path.join(Build_Config.stagePath, "RPMS"))
     Build_Config.setRpmNoArchPath()
     Build_Config.setRpmArchPath()
@@ -1565,6 +1568,7 @@ def process_env_build_params(ph_build_param):
         "INPUT_PHOTON_BUILD_NUMBER": "input-photon-build-number",
         "BASE_COMMIT": "base-commit",
         "THREADS": "threads",
+        "SPEC_PARSE_PROCESSES": "spec-parse-processes",
         "LOGLEVEL": "loglevel",
         "PHOTON_PULLSOURCES_CONFIG": "pull-sources-config",
         "PKG_BUILD_OPTIONS": "pkg-build-options",
@@ -1581,6 +1585,7 @@ def process_env_build_params(ph_build_param):
         "SCHEDULER_SERVER": "start-scheduler-server",
         "BUILD_EXTRA_PKGS": "build-extra-pkgs",
         "RESUME_BUILD": "resume-build",
+        "KEEP_GOING": "keep-going",
         "POI_IMAGE": "poi-image",
     }
 
@@ -1597,7 +1602,7 @@ def process_env_build_params(ph_build_param):
         if not val:
             continue
 
-        if k == "THREADS":
+        if k in {"THREADS", "SPEC_PARSE_PROCESSES"}:
             val = int(val)
         elif k in {
             "BUILD_SRC_RPM",
@@ -1609,6 +1614,7 @@ def process_env_build_params(ph_build_param):
             "ACVP_BUILD",
             "BUILD_EXTRA_PKGS",
             "RESUME_BUILD",
+            "KEEP_GOING",
         }:
             val = cmdUtils.strtobool(val)
         elif k == "RPMCHECK":
@@ -1645,6 +1651,13 @@ def main():
     parser.add_argument("-b", "--branch", dest="photonBranch", default=None)
     parser.add_argument("-c", "--config", dest="configPath", default=None)
     parser.add_argument("-t", "--target", dest="targetName", default=None)
+    parser.add_argument(
+        "-k",
+        "--keep-going",
+        dest="keepGoing",
+        action="store_true",
+        help="keep building the packages not depending on failed ones",
+    )
     parser.add_argument("args", nargs="*")
 
     options = parser.parse_args()
@@ -1696,6 +1709,8 @@ def main():
 
     ph_build_param = configdict["photon-build-param"]
     process_env_build_params(ph_build_param)
+    if options.keepGoing:
+        ph_build_param["keep-going"] = True
 
     cfgdict_additional_path = configdict["additional-path"]
     process_additional_cfgs(cfgdict_additional_path)
@@ -1772,6 +1787,7 @@ def main():
         elif targetName in targetDict["tool-checkup"]:
             attr = getattr(CheckTools, configdict["targetName"])
         else:
+            SPECS.setTargetPackages([targetName])
             RpmBuildTarget().package(targetName)
 
         if attr:
@@ -0,0 +1,724 @@
+#!/usr/bin/env python3
+
+import gc
+import os
+import sys
+import time
+import shutil
+import tempfile
+import traceback
+import tracemalloc
+
+import SpecParser
+import RpmVersion
+
+from argparse import ArgumentParser
+from constants import constants
+from DependencyIndex import DependencyIndex
+from distutilsversion import LooseVersion
+from distutilsversion import suppress_known_deprecation
+from Logger import Logger
+from MacroEngine import MacroEngine
+from PackageBuildDataGenerator import PackageBuildDataGenerator
+from SpecData import SpecData, SPECS
+from SpecDeps import SpecDependencyGenerator
+
+SPEC_FILE_DIR = "../../SPECS"
+LOG_FILE_DIR = "../../stage/LOGS"
+
+
+def timeIt(fn, *args):
+    start = time.monotonic()
+    result = fn(*args)
+    return time.monotonic() - start, result
+
+
+def bestOf(repeat, fn, *args):
+    return min(timeIt(fn, *args)[0] for _ in range(repeat))
+
+
+"""
+Startup cost of reading all spec files: without the spec cache, with an
+empty (cold) cache and with a populated (warm) cache.
+"""
+
+
+def benchmarkSpecCache(options, logger):
+    specDataArgs = (options.arch, options.log_path, options.spec_path)
+
+    constants.setBuildCachePath("")
+    uncached = bestOf(options.repeat, SpecData, *specDataArgs)
+
+    cachePath = tempfile.mkdtemp(prefix="spec-cache-")
+    constants.setBuildCachePath(cachePath)
+    try:
+        cold, _ = timeIt(SpecData, *specDataArgs)
+        warm = bestOf(options.repeat, SpecData, *specDataArgs)
+    finally:
+        constants.setBuildCachePath("")
+        shutil.rmtree(cachePath)
+
+    logger.info(f"No cache   : {uncached:.3f}s")
+    logger.info(f"Cold cache : {cold:.3f}s")
+    logger.info(f"Warm cache : {warm:.3f}s ({uncached / warm:.1f}x)")
+
+
+"""
+Parse time of all spec files (without the spec cache) for a growing number
+of parse processes.
+"""
+
+
+def benchmarkParallelParse(options, logger):
+    specDataArgs = (options.arch, options.log_path, options.spec_path)
+    constants.setBuildCachePath("")
+
+    numProcesses = 1
+    serial = None
+    while numProcesses <= options.processes:
+        constants.setSpecParseProcesses(numProcesses)
+        elapsed = bestOf(options.repeat, SpecData, *specDataArgs)
+        if serial is None:
+            serial = elapsed
+        logger.info(
+            f"{numProcesses:3} processes: {elapsed:.3f}s "
+            f"({serial / elapsed:.1f}x)"
+        )
+        numProcesses *= 2
+    constants.setSpecParseProcesses(0)
+
+
+"""
+Startup cost of reading all spec files for a cross build (without the spec
+cache): parsing them for each arch versus reusing the arch independent
+ones parsed for the build arch.
+"""
+
+
+def benchmarkCrossParse(options, logger):
+    constants.setBuildCachePath("")
+
+    def readSpecs(reuse):
+        base = SpecData(options.arch, options.log_path, options.spec_path)
+        SpecData(
+            options.target_arch,
+            options.log_path,
+            options.spec_path,
+            baseSpecData=base if reuse else None,
+        )
+        return base
+
+    separate = bestOf(options.repeat, readSpecs, False)
+    shared = bestOf(options.repeat, readSpecs, True)
+    _, base = timeIt(readSpecs, True)
+
+    logger.info(
+        f"Arch independent spec files: {len(base.mapArchIndependentSpecs)}"
+    )
+    logger.info(f"Parse per arch : {separate:.3f}s")
+    logger.info(f"Shared parse   : {shared:.3f}s ({separate / shared:.1f}x)")
+
+
+class RecordingMacroEngine(MacroEngine):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def define(self, name, value):
+        self.calls.append(("define", name, value))
+        super().define(name, value)
+
+    def setPackageName(self, packageName):
+        self.calls.append(("setPackageName", packageName))
+        super().setPackageName(packageName)
+
+    def expand(self, string):
+        self.calls.append(("expand", string))
+        return super().expand(string)
+
+
+"""
+Macro expansion alone: the calls made to the macro engine while parsing
+all spec files are recorded, then replayed on fresh engines.
+"""
+
+
+def benchmarkMacros(options, logger):
+    engines = []
+
+    def recordingEngine():
+        engines.append(RecordingMacroEngine())
+        return engines[-1]
+
+    listSpecFiles = SpecData.getListSpecFiles(options.spec_path)
+
+    SpecParser.MacroEngine = recordingEngine
+    try:
+        for specFile in listSpecFiles:
+            SpecParser.SpecParser(specFile, options.arch)
+    finally:
+        SpecParser.MacroEngine = MacroEngine
+
+    recorded = [engine.calls for engine in engines]
+
+    def replay():
+        for calls in recorded:
+            engine = MacroEngine()
+            for call in calls:
+                getattr(engine, call[0])(*call[1:])
+
+    numExpansions = sum(
+        1 for calls in recorded for call in calls if call[0] == "expand"
+    )
+    elapsed = bestOf(options.repeat, replay)
+    logger.info(f"Spec files : {len(recorded)}")
+    logger.info(f"Expansions : {numExpansions}")
+    logger.info(
+        f"Total      : {elapsed:.3f}s "
+        f"({elapsed / numExpansions * 1e6:.2f}us per expansion)"
+    )
+
+
+"""
+Parse time of the ten spec files which count the most lines matching
+given predicate.
+"""
+
+
+def benchmarkParseTop(options, logger, predicate, unit):
+    listSpecFiles = SpecData.getListSpecFiles(options.spec_path)
+
+    counts = {}
+    for specFile in listSpecFiles:
+        with open(specFile) as f:
+            counts[specFile] = sum(1 for line in f if predicate(line))
+    listSpecFiles = sorted(
+        listSpecFiles, key=lambda f: counts[f], reverse=True
+    )[:10]
+
+    total = 0
+    for specFile in listSpecFiles:
+        elapsed = bestOf(
+            options.repeat, SpecParser.SpecParser, specFile, options.arch
+        )
+        total += elapsed
+        logger.info(
+            f"{os.path.basename(specFile):30} "
+            f"{counts[specFile]:5} {unit}: {elapsed * 1e3:.2f}ms"
+        )
+    logger.info(f"Total: {total * 1e3:.2f}ms")
+
+
+def benchmarkConditions(options, logger):
+    benchmarkParseTop(
+        options, logger, lambda line: line.startswith("%if "), "conditions"
+    )
+
+
+def benchmarkLargestSpecs(options, logger):
+    benchmarkParseTop(options, logger, lambda line: True, "lines")
+
+
+"""
+Per package lookups done by PackageUtils, PackageManager and SpecDeps,
+called for every subpackage of every spec file.
+"""
+
+
+def benchmarkAccessors(options, logger):
+    specData = SpecData(options.arch, options.log_path, options.spec_path)
+    packages = [
+        (package, version)
+        for name in specData.getListPackages()
+        for version in specData.getVersions(name)
+        for package in specData.getPackages(name, version)
+    ]
+    accessors = [
+        specData.getRelease,
+        specData.getBuildArch,
+        specData.getSpecFile,
+        specData.getRPMPackages,
+        specData.getSecurityHardeningOption,
+        specData.isCheckAvailable,
+    ]
+
+    def callAccessors():
+        for package, version in packages:
+            for accessor in accessors:
+                accessor(package, version)
+
+    elapsed = bestOf(options.repeat, callAccessors)
+    numCalls = len(packages) * len(accessors)
+    logger.info(f"Packages : {len(packages)}")
+    logger.info(
+        f"Total    : {elapsed:.3f}s ({elapsed / numCalls * 1e6:.2f}us per "
+        "call)"
+    )
+
+
+"""
+Resolution of the versioned BuildRequires and Requires of every
+subpackage (for the build arch), twice on the same SpecData.
+"""
+
+
+def benchmarkDependencies(options, logger):
+    # SPECS defines the kernel macros some dependencies refer to
+    specData = SPECS.getData(constants.buildArch)
+    packages = [
+        (package, version)
+        for name in specData.getListPackages()
+        for version in specData.getVersions(name)
+        for package in specData.getPackages(name, version)
+    ]
+
+    def resolveDependencies():
+        for package, version in packages:
+            specData.getBuildRequiresForPackage(package, version)
+            specData.getRequiresAllForPackage(package, version)
+            specData.getRequiresForPackage(package, version)
+
+    first, _ = timeIt(resolveDependencies)
+    second, _ = timeIt(resolveDependencies)
+    logger.info(f"Packages    : {len(packages)}")
+    logger.info(f"First pass  : {first:.3f}s")
+    logger.info(f"Second pass : {second:.3f}s")
+
+
+"""
+Transitive dependencies: the build time dependency trees of every base
+package, as the scheduler asks for them, and the install time dependency
+levels of all packages, as computed for the package lists.
+"""
+
+
+def benchmarkRequiresTrees(options, logger):
+    specData = SPECS.getData(constants.buildArch)
+    basePkgs = [
+        f"{name}-{version}"
+        for name in specData.getListPackages()
+        for version in specData.getVersions(name)
+    ]
+
+    def getTrees():
+        for pkg in basePkgs:
+            try:
+                specData.getRequiresTreeOfBasePkgsForPkg(pkg)
+            except Exception:
+                pass
+
+    def getLevels():
+        mapDependencies = {}
+        SpecDependencyGenerator(
+            options.log_path, "error"
+        ).calculateSpecDependency(
+            specData.getListPackages(), mapDependencies, {}
+        )
+        return mapDependencies
+
+    trees, _ = timeIt(getTrees)
+    levels, mapDependencies = timeIt(getLevels)
+    logger.info(f"Base packages    : {len(basePkgs)}")
+    logger.info(f"Requires trees   : {trees:.3f}s")
+    logger.info(
+        f"Dependency levels: {levels:.3f}s ({len(mapDependencies)} packages)"
+    )
+
+
+# Known results of rpmvercmp, from rpm's test suite
+KNOWN_VERSION_COMPARISONS = [
+    ("1.0", "1.0", 0),
+    ("1.0", "2.0", -1),
+    ("2.0", "1.0", 1),
+    ("2.0.1", "2.0.1", 0),
+    ("2.0", "2.0.1", -1),
+    ("2.0.1", "2.0", 1),
+    ("2.0.1a", "2.0.1a", 0),
+    ("2.0.1a", "2.0.1", 1),
+    ("2.0.1", "2.0.1a", -1),
+    ("5.5p1", "5.5p1", 0),
+    ("5.5p1", "5.5p2", -1),
+    ("5.5p2", "5.5p1", 1),
+    ("5.5p10", "5.5p10", 0),
+    ("5.5p1", "5.5p10", -1),
+    ("5.5p10", "5.5p1", 1),
+    ("10xyz", "10.1xyz", -1),
+    ("10.1xyz", "10xyz", 1),
+    ("xyz10", "xyz10", 0),
+    ("xyz10", "xyz10.1", -1),
+    ("xyz10.1", "xyz10", 1),
+    ("xyz.4", "xyz.4", 0),
+    ("xyz.4", "8", -1),
+    ("8", "xyz.4", 1),
+    ("xyz.4", "2", -1),
+    ("2", "xyz.4", 1),
+    ("5.5p2", "5.6p1", -1),
+    ("5.6p1", "5.5p2", 1),
+    ("5.6p1", "6.5p1", -1),
+    ("6.5p1", "5.6p1", 1),
+    ("6.0.rc1", "6.0", 1),
+    ("6.0", "6.0.rc1", -1),
+    ("10b2", "10a1", 1),
+    ("10a2", "10b2", -1),
+    ("1.0aa", "1.0aa", 0),
+    ("1.0a", "1.0aa", -1),
+    ("1.0aa", "1.0a", 1),
+    ("10.0001", "10.0001", 0),
+    ("10.0001", "10.1", 0),
+    ("10.1", "10.0001", 0),
+    ("10.0001", "10.0039", -1),
+    ("10.0039", "10.0001", 1),
+    ("4.999.9", "5.0", -1),
+    ("5.0", "4.999.9", 1),
+    ("20101121", "20101121", 0),
+    ("20101121", "20101122", -1),
+    ("20101122", "20101121", 1),
+    ("2_0", "2_0", 0),
+    ("2.0", "2_0", 0),
+    ("2_0", "2.0", 0),
+    ("a", "a", 0),
+    ("a+", "a+", 0),
+    ("a+", "a_", 0),
+    ("a_", "a+", 0),
+    ("+a", "+a", 0),
+    ("+a", "_a", 0),
+    ("_a", "+a", 0),
+    ("+_", "+_", 0),
+    ("_+", "+_", 0),
+    ("_+", "_+", 0),
+    ("+", "_", 0),
+    ("_", "+", 0),
+    ("1.0~rc1", "1.0~rc1", 0),
+    ("1.0~rc1", "1.0", -1),
+    ("1.0", "1.0~rc1", 1),
+    ("1.0~rc1", "1.0~rc2", -1),
+    ("1.0~rc2", "1.0~rc1", 1),
+    ("1.0~rc1~git123", "1.0~rc1~git123", 0),
+    ("1.0~rc1~git123", "1.0~rc1", -1),
+    ("1.0~rc1", "1.0~rc1~git123", 1),
+    ("1.0^", "1.0^", 0),
+    ("1.0^", "1.0", 1),
+    ("1.0", "1.0^", -1),
+    ("1.0^git1", "1.0^git1", 0),
+    ("1.0^git1", "1.0", 1),
+    ("1.0", "1.0^git1", -1),
+    ("1.0^git1", "1.0^git2", -1),
+    ("1.0^git2", "1.0^git1", 1),
+    ("1.0^git1", "1.01", -1),
+    ("1.01", "1.0^git1", 1),
+    ("1.0^20160101", "1.0^20160101", 0),
+    ("1.0^20160101", "1.0.1", -1),
+    ("1.0.1", "1.0^20160101", 1),
+    ("1.0^20160101^git1", "1.0^20160101^git1", 0),
+    ("1.0^20160102", "1.0^20160101^git1", 1),
+    ("1.0^20160101^git1", "1.0^20160102", -1),
+    ("1.0~rc1^git1", "1.0~rc1^git1", 0),
+    ("1.0~rc1^git1", "1.0~rc1", 1),
+    ("1.0~rc1", "1.0~rc1^git1", -1),
+    ("1.0^git1~pre", "1.0^git1~pre", 0),
+    ("1.0^git1", "1.0^git1~pre", 1),
+    ("1.0^git1~pre", "1.0^git1", -1),
+]
+
+
+"""
+Checks RpmVersion against known rpmvercmp results, then compares parsing
+and sorting all version-release strings of SPECS with RpmVersion and
+LooseVersion. (StrictVersion can not parse most of them.)
+"""
+
+
+def benchmarkVersions(options, logger):
+    failures = 0
+    for a, b, expected in KNOWN_VERSION_COMPARISONS:
+        result = RpmVersion.compareVersions(a, b)
+        if result != expected:
+            logger.error(f"{a} vs {b}: {result}, expected {expected}")
+            failures += 1
+    if failures:
+        raise Exception(f"{failures} version comparisons failed")
+    logger.info(
+        f"Known comparisons: {len(KNOWN_VERSION_COMPARISONS)} passed"
+    )
+
+    specData = SpecData(options.arch, options.log_path, options.spec_path)
+    versions = [
+        f"{specObj.version}-{specObj.release}"
+        for specObjs in specData.mapSpecObjects.values()
+        for specObj in specObjs
+    ]
+
+    def rpmKeys():
+        RpmVersion.versionKey.cache_clear()
+        return [RpmVersion.versionKey(v) for v in versions]
+
+    def looseKeys():
+        with suppress_known_deprecation():
+            return [LooseVersion(v) for v in versions]
+
+    def rpmSort():
+        return sorted(versions, key=RpmVersion.versionKey)
+
+    def looseSort():
+        with suppress_known_deprecation():
+            return sorted(versions, key=LooseVersion)
+
+    benchmarks = [
+        ("parse, RpmVersion", rpmKeys),
+        ("parse, LooseVersion", looseKeys),
+        ("sort, RpmVersion (cached keys)", rpmSort),
+        ("sort, LooseVersion", looseSort),
+    ]
+    logger.info(f"{len(versions)} version-release strings of SPECS:")
+    for name, fn in benchmarks:
+        try:
+            elapsed = bestOf(options.repeat, fn)
+            logger.info(f"  {name:32}: {elapsed * 1e3:.2f}ms")
+        except Exception as e:
+            logger.info(f"  {name:32}: failed ({e})")
+
+
+def currentRss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+"""
+Memory kept by SpecData of both archs (without the spec cache): growth of
+the resident set size, and the size of the objects still allocated after
+loading according to tracemalloc.
+"""
+
+
+def benchmarkMemory(options, logger):
+    constants.setBuildCachePath("")
+
+    def loadSpecData():
+        base = SpecData(options.arch, options.log_path, options.spec_path)
+        target = SpecData(
+            options.target_arch,
+            options.log_path,
+            options.spec_path,
+            baseSpecData=base,
+        )
+        return base, target
+
+    gc.collect()
+    rssBefore = currentRss()
+    specData = loadSpecData()
+    gc.collect()
+    rss = currentRss() - rssBefore
+    del specData
+
+    gc.collect()
+    tracemalloc.start()
+    specData = loadSpecData()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mb = 1024 * 1024
+    logger.info(f"RSS growth      : {rss / mb:.1f}MB")
+    logger.info(f"Retained objects: {retained / mb:.1f}MB")
+    logger.info(f"Peak allocated  : {peak / mb:.1f}MB")
+
+
+"""
+Startup cost of a SpecData for single packages, which loads only the spec
+files in their dependency closure, versus loading all spec files. Both
+with a warm spec cache and spec index.
+"""
+
+
+def benchmarkClosureLoad(options, logger):
+    specDataArgs = (options.arch, options.log_path, options.spec_path)
+    cachePath = tempfile.mkdtemp(prefix="spec-cache-")
+    constants.setBuildCachePath(cachePath)
+    try:
+        SpecData(*specDataArgs)
+        full = bestOf(options.repeat, SpecData, *specDataArgs)
+        logger.info(f"{'all spec files':24}: {full:.3f}s")
+        for package in options.packages.split(","):
+            elapsed = bestOf(
+                options.repeat, SpecData, *specDataArgs, None, [package]
+            )
+            specData = SpecData(*specDataArgs, None, [package])
+            logger.info(
+                f"{package:24}: {elapsed:.3f}s "
+                f"({len(specData.mapParsedSpecs)} spec files)"
+            )
+    finally:
+        constants.setBuildCachePath("")
+        shutil.rmtree(cachePath)
+
+
+"""
+Upward dependencies of the spec files of some packages, as incremental
+builds look them up to remove the RPMs to rebuild. The first query builds
+the reverse dependency index.
+"""
+
+
+def benchmarkUpwardDeps(options, logger):
+    specData = SPECS.getData(constants.buildArch)
+    specDeps = SpecDependencyGenerator(options.log_path, "error")
+    for package in options.packages.split(","):
+        version = specData.getHighestVersion(package)
+        specFile = os.path.basename(specData.getSpecFile(package, version))
+        elapsed, whoNeeds = timeIt(
+            specDeps.process, "get-upward-deps", specFile, "tree"
+        )
+        logger.info(
+            f"{specFile:24}: {elapsed:.3f}s ({len(whoNeeds)} packages)"
+        )
+
+
+"""
+Dependency queries answered from the persisted dependency index: loading
+and validating the index, then a forward and a reverse tree, a shortest
+path and the upward dependencies for each package.
+"""
+
+
+def benchmarkDependencyIndex(options, logger):
+    cachePath = tempfile.mkdtemp(prefix="dep-index-")
+    constants.setBuildCachePath(cachePath)
+    try:
+        build, _ = timeIt(DependencyIndex, options.arch)
+        load, depIndex = timeIt(DependencyIndex, options.arch)
+        logger.info(f"{'build index':24}: {build:.3f}s")
+        logger.info(f"{'load index':24}: {load:.3f}s")
+        for package in options.packages.split(","):
+            basePkg = depIndex.getBasePkg(package)
+            specFileName = next(
+                f
+                for f, p in depIndex.mapSpecFileNameToBasePkg.items()
+                if p == basePkg
+            )
+
+            def query():
+                depIndex.getRequiresTree(package, True)
+                depIndex.getDependentsTree(package)
+                depIndex.getPath(package, "glibc", True)
+                depIndex.getUpwardDeps(specFileName)
+
+            elapsed = bestOf(options.repeat, query)
+            logger.info(f"{package:24}: {elapsed * 1000:.2f}ms")
+    finally:
+        constants.setBuildCachePath("")
+        shutil.rmtree(cachePath)
+
+
+"""
+Build order of all packages: reading the build and runtime dependency
+graph with its cycles, then ordering it.
+"""
+
+
+def benchmarkBuildOrder(options, logger):
+    specData = SPECS.getData(constants.buildArch)
+    basePkgs = [
+        f"{name}-{version}"
+        for name in specData.getListPackages()
+        for version in specData.getVersions(name)
+    ]
+
+    def readGraph():
+        pkgBuildDataGen = PackageBuildDataGenerator()
+        pkgBuildDataGen._readDependencyGraphAndCyclesForGivenPackages(
+            basePkgs
+        )
+        return pkgBuildDataGen
+
+    readTimes = []
+    sortTimes = []
+    for _ in range(options.repeat):
+        elapsed, pkgBuildDataGen = timeIt(readGraph)
+        readTimes.append(elapsed)
+        sortTimes.append(
+            timeIt(pkgBuildDataGen._getSortedBuildOrderList)[0]
+        )
+    logger.info(f"Base packages : {len(basePkgs)}")
+    logger.info(f"Read graph    : {min(readTimes):.3f}s")
+    logger.info(f"Sort          : {min(sortTimes):.3f}s")
+
+
+BENCHMARKS = {
+    "spec-cache": benchmarkSpecCache,
+    "parallel-parse": benchmarkParallelParse,
+    "cross-parse": benchmarkCrossParse,
+    "macros": benchmarkMacros,
+    "conditions": benchmarkConditions,
+    "largest-specs": benchmarkLargestSpecs,
+    "accessors": benchmarkAccessors,
+    "dependencies": benchmarkDependencies,
+    "requires-trees": benchmarkRequiresTrees,
+    "versions": benchmarkVersions,
+    "memory": benchmarkMemory,
+    "closure-load": benchmarkClosureLoad,
+    "upward-deps": benchmarkUpwardDeps,
+    "dependency-index": benchmarkDependencyIndex,
+    "build-order": benchmarkBuildOrder,
+}
+
+
+def main():
+    usage = "Usage: %prog [options]"
+    parser = ArgumentParser(usage)
+    parser.add_argument(
+        "-m",
+        "--mode",
+        dest="mode",
+        choices=list(BENCHMARKS.keys()),
+        required=True,
+    )
+    parser.add_argument(
+        "-s", "--spec-path", dest="spec_path", default=SPEC_FILE_DIR
+    )
+    parser.add_argument(
+        "-l", "--log-path", dest="log_path", default=LOG_FILE_DIR
+    )
+    parser.add_argument(
+        "-a", "--arch", dest="arch", default=constants.buildArch
+    )
+    parser.add_argument(
+        "-t", "--target-arch", dest="target_arch", default="aarch64"
+    )
+    parser.add_argument(
+        "-r", "--repeat", dest="repeat", type=int, default=3
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        dest="processes",
+        type=int,
+        default=os.cpu_count(),
+    )
+    parser.add_argument(
+        "-k",
+        "--packages",
+        dest="packages",
+        default="zlib,openssl,systemd,tdnf",
+        help="comma separated packages for closure-load, upward-deps and "
+        "dependency-index",
+    )
+    options = parser.parse_args()
+
+    constants.setSpecPath(options.spec_path)
+    constants.setLogPath(options.log_path)
+    constants.setLogLevel("info")
+    constants.initialize()
+
+    logger = Logger.getLogger("Benchmark", options.log_path, "info")
+    try:
+        BENCHMARKS[options.mode](options, logger)
+    except Exception as e:
+        traceback.print_exc()
+        sys.stderr.write(str(e))
+        sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import math
+
+from constants import constants
+from Logger import Logger
+from StringUtils import StringUtils
+
+# Memory assumed per core for packages whose builds were never measured,
+# in MiB
+SEED_MEMORY_PER_CPU = 512
+
+# Share of the host memory a single build is assumed to use at most
+MAX_MEMORY_SHARE = 0.5
+
+# Weight of a new measurement against the current profile
+SMOOTHING = 0.5
+
+# A build keeping at least this share of its cores busy may use more
+SATURATION = 0.9
+
+CGROUP_PATH = "/sys/fs/cgroup"
+
+
+class BuildResources(object):
+    """
+    Resource profiles of package builds, per package name: the number of
+    cores a build keeps busy and its peak memory in MiB. Also the capacity
+    of the build host, which profiles are clamped to: the cores this
+    process may run on and the physical memory, both within the limits of
+    its cgroup.
+
+    A package gets a profile once a build of it was measured, which is
+    when it is built in a chroot. Until then its builds are not limited to
+    a number of cores, and each core is assumed to use SEED_MEMORY_PER_CPU.
+    Each measurement refines the profile:
+    - cores: the CPU time of the build over its wall time. A build which
+      kept all allocated cores busy may use more, so its profile does not
+      decrease then, and grows towards twice its allocation;
+    - memory: the peak resident size of its largest process, times the
+      allocated cores it kept busy, but not more than MAX_MEMORY_SHARE of
+      the host memory.
+    Profiles are persisted below constants.buildCachePath.
+    """
+
+    def __init__(self, arch=None):
+        self.arch = arch or constants.currentArch
+        self.logger = Logger.getLogger(
+            "BuildResources", constants.logPath, constants.logLevel
+        )
+        self.hostCpus = self._getHostCpus()
+        self.hostMemory = self._getHostMemory()
+
+        # map package name to its measured profile
+        self.profiles = {}
+        self.profilesPath = None
+        if constants.buildCachePath:
+            self.profilesPath = os.path.join(
+                constants.buildCachePath, "resources", f"{self.arch}.json"
+            )
+            self._load()
+
+    # Returns the content of given file of the cgroup of this process, ""
+    # if there is none. controller is the cgroup v1 hierarchy the file
+    # belongs to, it does not matter with cgroup v2.
+    @staticmethod
+    def _readCgroupFile(controller, fileName):
+        try:
+            with open("/proc/self/cgroup") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return ""
+        for line in lines:
+            hierarchy, controllers, cgroup = line.split(":", 2)
+            if hierarchy == "0":
+                mountPath = CGROUP_PATH
+            elif controller in controllers.split(","):
+                mountPath = os.path.join(CGROUP_PATH, controller)
+            else:
+                continue
+            # in a container, the cgroup is mounted as the root
+            for path in [mountPath + cgroup.rstrip("/"), mountPath]:
+                try:
+                    with open(os.path.join(path, fileName)) as f:
+                        return f.read().strip()
+                except OSError:
+                    pass
+        return ""
+
+    def _getHostCpus(self):
+        cpus = len(os.sched_getaffinity(0))
+        quota = self._readCgroupFile("cpu", "cpu.max").split()
+        if not quota:
+            quota = [
+                self._readCgroupFile("cpu", "cpu.cfs_quota_us"),
+                self._readCgroupFile("cpu", "cpu.cfs_period_us"),
+            ]
+        if len(quota) == 2 and all(q.isdigit() for q in quota):
+            cpus = min(cpus, max(1, math.ceil(int(quota[0]) / int(quota[1]))))
+        return cpus
+
+    def _getHostMemory(self):
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        limit = self._readCgroupFile("memory", "memory.max")
+        if not limit:
+            limit = self._readCgroupFile("memory", "memory.limit_in_bytes")
+        if limit.isdigit():
+            memory = min(memory, int(limit))
+        return memory // 2**20
+
+    def _load(self):
+        try:
+            with open(self.profilesPath) as f:
+                profiles = dict(json.load(f))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.debug(f"Ignoring broken resource profiles: {e}")
+            return
+        for packageName, profile in profiles.items():
+            try:
+                if profile["cpus"] > 0 and profile["memory"] >= 1:
+                    self.profiles[packageName] = profile
+                    continue
+            except (KeyError, TypeError):
+                pass
+            self.logger.debug(
+                f"Ignoring broken resource profile of {packageName}: "
+                f"{profile}"
+            )
+
+    def save(self):
+        if not self.profilesPath:
+            return
+        os.makedirs(os.path.dirname(self.profilesPath), exist_ok=True)
+        tmpPath = f"{self.profilesPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.profiles, f, sort_keys=True, indent=4)
+        os.replace(tmpPath, self.profilesPath)
+
+    def _getMaxMemory(self):
+        return MAX_MEMORY_SHARE * self.hostMemory
+
+    # Returns (cores, memory) to allocate to the build of given package
+    # ("name-version"), never more than the host has. Cores are None if
+    # the package has no profile, memory is then the memory of one core.
+    def getAllocation(self, package):
+        packageName, _ = StringUtils.splitPackageNameAndVersion(package)
+        profile = self.profiles.get(packageName)
+        if profile is None:
+            return None, SEED_MEMORY_PER_CPU
+        cpus = min(max(1, math.ceil(profile["cpus"])), self.hostCpus)
+        memory = math.ceil(min(profile["memory"], self._getMaxMemory()))
+        return cpus, memory
+
+    """
+    Refines the profile of given package with the usage of a build it was
+    allocated given cores for: its "wallTime" and "cpuTime" in seconds and
+    the "maxRss" of its largest process in KiB.
+    """
+
+    def update(self, package, cpus, usage):
+        if usage.get("wallTime", 0) <= 0 or "cpuTime" not in usage:
+            return
+        packageName, _ = StringUtils.splitPackageNameAndVersion(package)
+        profile = self.profiles.get(packageName)
+        busyCpus = usage["cpuTime"] / usage["wallTime"]
+        if busyCpus >= SATURATION * cpus:
+            measuredCpus = min(2 * cpus, self.hostCpus)
+            if profile is not None:
+                measuredCpus = max(measuredCpus, profile["cpus"])
+        else:
+            measuredCpus = max(1.0, busyCpus)
+        measuredMemory = min(
+            max(1.0, usage["maxRss"] / 1024 * min(max(1.0, busyCpus), cpus)),
+            self._getMaxMemory(),
+        )
+
+        if profile is None:
+            profile = {"cpus": measuredCpus, "memory": measuredMemory}
+        self.profiles[packageName] = {
+            "cpus": round(
+                profile["cpus"]
+                + SMOOTHING * (measuredCpus - profile["cpus"]),
+                2,
+            ),
+            "memory": round(
+                profile["memory"]
+                + SMOOTHING * (measuredMemory - profile["memory"])
+            ),
+        }
+        self.logger.debug(
+            f"Resource profile of {packageName}: {self.profiles[packageName]}"
+            f" (measured {busyCpus:.1f} busy cores, "
+            f"{measuredMemory:.0f} MiB)"
+        )
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 import subprocess
 
 
@@ -27,7 +28,12 @@ class CommandUtils:
 
     @staticmethod
     def runBashCmd(
-        cmd, logfile=None, logfn=None, capture=False, ignore_rc=False
+        cmd,
+        logfile=None,
+        logfn=None,
+        capture=False,
+        ignore_rc=False,
+        usage=None,
     ):
         fp = None
         if logfile:
@@ -45,6 +51,16 @@ class CommandUtils:
             stderr=stdout,
         )
 
+        if usage is not None and logfile:
+            # Reap the process here, for the resource usage of it and of
+            # its descendants: "cpuTime" in seconds and the "maxRss" of
+            # the largest process in KiB. Nothing is piped in this case,
+            # so there is nothing left to communicate.
+            _, status, rusage = os.wait4(sp.pid, 0)
+            sp.returncode = os.waitstatus_to_exitcode(status)
+            usage["cpuTime"] = rusage.ru_utime + rusage.ru_stime
+            usage["maxRss"] = rusage.ru_maxrss
+
         out, err = sp.communicate()
         rc = sp.wait()
 
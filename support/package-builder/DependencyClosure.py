@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+
+class DependencyClosure(object):
+    """
+    Memoized transitive closures of a dependency relation between packages.
+
+    Packages get dense integer ids in the order they are first seen. The
+    direct dependencies of a package are looked up once through
+    lookupDependencies (package -> list of packages) and kept as a tuple of
+    ids. Closures are reflexive (a package is part of its own closure) and
+    kept as bitsets, Python ints with bit i set for package id i.
+
+    Closures are computed per strongly connected component, with an
+    iterative Tarjan walk: all packages of a dependency cycle share one
+    closure, which is the union of the component and of the closures of
+    the components it depends on. Components are completed in reverse
+    topological order, so these are always known already. They are kept
+    in that order, which gives the levels of getLevels in a single pass.
+    """
+
+    def __init__(self, lookupDependencies):
+        self.lookupDependencies = lookupDependencies
+        # map package to id
+        self.mapPackageToId = {}
+        # package of each id
+        self.packages = []
+        # direct dependencies of each id, None until looked up
+        self.dependencies = []
+        # closure bitset of each id, None until computed
+        self.closures = []
+        # member ids of the components completed so far, dependencies
+        # before the components depending on them
+        self.components = []
+        # component index of each id, None until its closure is computed
+        self.componentOf = []
+
+    def getId(self, package):
+        pkgId = self.mapPackageToId.get(package)
+        if pkgId is None:
+            pkgId = len(self.packages)
+            self.mapPackageToId[package] = pkgId
+            self.packages.append(package)
+            self.dependencies.append(None)
+            self.closures.append(None)
+            self.componentOf.append(None)
+        return pkgId
+
+    def _getDependencyIds(self, pkgId):
+        dependencies = self.dependencies[pkgId]
+        if dependencies is None:
+            dependencies = tuple(
+                self.getId(p)
+                for p in self.lookupDependencies(self.packages[pkgId])
+            )
+            self.dependencies[pkgId] = dependencies
+        return dependencies
+
+    # Returns direct dependencies of given package
+    def getDependencies(self, package):
+        depIds = self._getDependencyIds(self.getId(package))
+        return [self.packages[i] for i in depIds]
+
+    # Returns closure bitset of given package
+    def getClosure(self, package):
+        pkgId = self.getId(package)
+        if self.closures[pkgId] is None:
+            self._computeClosures(pkgId)
+        return self.closures[pkgId]
+
+    def _getIds(self, bits):
+        ids = []
+        while bits:
+            lowestBit = bits & -bits
+            ids.append(lowestBit.bit_length() - 1)
+            bits ^= lowestBit
+        return ids
+
+    # Returns packages of given bitset, in the order of their ids
+    def getPackages(self, bits):
+        return [self.packages[i] for i in self._getIds(bits)]
+
+    """
+    Returns map of the packages of the closure of given packages to their
+    level, the length of the longest chain of dependencies leading to them
+    from given packages. All packages of a dependency cycle share one
+    level, and a package of listPackages required by another one gets a
+    level from that.
+    """
+
+    def getLevels(self, listPackages):
+        closure = 0
+        for package in listPackages:
+            closure |= self.getClosure(package)
+        ids = self._getIds(closure)
+
+        # components depending on a component come after it, so walking
+        # them backwards settles the level of each before it is used
+        componentLevels = {}
+        for component in sorted(
+            {self.componentOf[i] for i in ids}, reverse=True
+        ):
+            level = componentLevels.setdefault(component, 0) + 1
+            for memberId in self.components[component]:
+                for depId in self.dependencies[memberId]:
+                    depComponent = self.componentOf[depId]
+                    if (
+                        depComponent != component
+                        and componentLevels.get(depComponent, 0) < level
+                    ):
+                        componentLevels[depComponent] = level
+        return {
+            self.packages[i]: componentLevels[self.componentOf[i]]
+            for i in ids
+        }
+
+    def _computeClosures(self, rootId):
+        index = {rootId: 0}
+        lowLink = {rootId: 0}
+        stack = [rootId]
+        onStack = {rootId}
+        work = [(rootId, iter(self._getDependencyIds(rootId)))]
+        while work:
+            pkgId, dependencies = work[-1]
+            for depId in dependencies:
+                if self.closures[depId] is not None:
+                    continue
+                if depId not in index:
+                    index[depId] = lowLink[depId] = len(index)
+                    stack.append(depId)
+                    onStack.add(depId)
+                    work.append((depId, iter(self._getDependencyIds(depId))))
+                    break
+                if depId in onStack:
+                    lowLink[pkgId] = min(lowLink[pkgId], index[depId])
+            else:
+                work.pop()
+                if work:
+                    parentId = work[-1][0]
+                    lowLink[parentId] = min(lowLink[parentId], lowLink[pkgId])
+                if lowLink[pkgId] == index[pkgId]:
+                    self._completeComponent(pkgId, stack, onStack)
+
+    def _completeComponent(self, rootId, stack, onStack):
+        members = []
+        while True:
+            memberId = stack.pop()
+            onStack.discard(memberId)
+            members.append(memberId)
+            if memberId == rootId:
+                break
+
+        component = len(self.components)
+        self.components.append(members)
+        closure = 0
+        for memberId in members:
+            self.componentOf[memberId] = component
+            closure |= 1 << memberId
+        for memberId in members:
+            for depId in self.dependencies[memberId]:
+                depClosure = self.closures[depId]
+                if depClosure is not None:
+                    closure |= depClosure
+        for memberId in members:
+            self.closures[memberId] = closure
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import traceback
+
+from collections import deque
+from argparse import ArgumentParser
+from constants import constants
+from Logger import Logger
+from SpecCache import PARSER_MODULES, getConfigDigest, hashFile
+from SpecData import SpecData, SPECS
+
+SPEC_FILE_DIR = "../../SPECS"
+LOG_FILE_DIR = "../../stage/LOGS"
+DATA_DIR = "../../common/data"
+
+# Modules whose code affects the dependency graph, besides the parser
+INDEX_MODULES = PARSER_MODULES + ["SpecData.py", "DependencyIndex.py"]
+
+# Macros SPECS takes from the linux spec file, whose hash is recorded
+# anyway. The index is found whether SPECS was initialized or not.
+KERNEL_MACROS = ["KERNEL_VERSION", "KERNEL_RELEASE", "kernelsubrelease"]
+
+
+class DependencyIndex(object):
+    """
+    Dependency graph of the packages of one arch, for queries which do not
+    read any spec file: forward and reverse dependency trees, shortest
+    dependency paths, closures of package lists and upward dependencies of
+    spec files.
+
+    The graph is built from a fully loaded SpecData and persisted below
+    constants.buildCachePath, keyed like the spec cache by arch, macros,
+    build options and code. It is valid while the set of spec files and
+    the content hashes of them and of the files they %include are the
+    recorded ones. Files whose inode, mtime and size did not change are not
+    hashed again.
+
+    Packages are given as "name-version" or as names, which stand for the
+    highest version of the package.
+    """
+
+    def __init__(self, arch=None):
+        self.arch = arch or constants.currentArch
+        self.logger = Logger.getLogger(
+            "DependencyIndex", constants.logPath, constants.logLevel
+        )
+        self.indexPath = None
+        if constants.buildCachePath:
+            digest = getConfigDigest(self.arch, INDEX_MODULES, KERNEL_MACROS)
+            self.indexPath = os.path.join(
+                constants.buildCachePath,
+                "depindex",
+                f"{self.arch}-{digest}.json",
+            )
+
+        graph = self._load()
+        if graph is None:
+            graph = self._build()
+            self._save(graph)
+        self._setGraph(graph)
+
+    def _load(self):
+        if not self.indexPath:
+            return None
+        try:
+            with open(self.indexPath) as f:
+                graph = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.debug(f"Ignoring broken dependency index: {e}")
+            return None
+        if not self._isValid(graph):
+            self.logger.debug("Dependency index is outdated")
+            return None
+        return graph
+
+    def _isValid(self, graph):
+        listSpecFiles = sorted(SpecData.getListSpecFiles(constants.specPath))
+        if listSpecFiles != graph["specFiles"]:
+            return False
+        try:
+            for path, (ino, mtime, size, fileHash) in graph["files"].items():
+                stat = os.stat(path)
+                if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (
+                    ino,
+                    mtime,
+                    size,
+                ):
+                    continue
+                if hashFile(path) != fileHash:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def _build(self):
+        specData = SPECS.getData(self.arch)
+        basePkgs = {}
+        for package in specData.getListPackages():
+            for version in specData.getVersions(package):
+                basePkg = f"{package}-{version}"
+                buildRequires = specData.getBuildRequiresForPkg(basePkg)
+                requires = buildRequires + specData.getRequiresAllForPkg(
+                    basePkg
+                )
+                basePkgs[basePkg] = {
+                    "buildRequires": buildRequires,
+                    "requiredBasePkgs": list(
+                        dict.fromkeys(specData.getBasePkg(p) for p in requires)
+                    ),
+                }
+
+        # map package to its base package and Requires
+        pkgs = {}
+        highestVersions = {}
+        for package, specName in specData.mapPackageToSpec.items():
+            highestVersions[package] = specData.getHighestVersion(package)
+            for specObj in specData.mapSpecObjects[specName]:
+                pkg = f"{package}-{specObj.version}"
+                pkgs[pkg] = [
+                    f"{specName}-{specObj.version}",
+                    specData.getRequiresForPkg(pkg),
+                ]
+
+        specFileNames = {
+            specFileName: f"{specObj.name}-{specObj.version}"
+            for specFileName, specObj in (
+                specData.mapSpecFileNameToSpecObj.items()
+            )
+        }
+
+        files = {}
+        for hashes in specData.mapSpecFileToHashes.values():
+            for path, fileHash in hashes.items():
+                stat = os.stat(path)
+                files[path] = [
+                    stat.st_ino,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    fileHash,
+                ]
+
+        return {
+            "specFiles": specData.listSpecFiles,
+            "files": files,
+            "basePkgs": basePkgs,
+            "pkgs": pkgs,
+            "highestVersions": highestVersions,
+            "specFileNames": specFileNames,
+        }
+
+    def _save(self, graph):
+        if not self.indexPath:
+            return
+        # a file which changed while it was read would be recorded with
+        # its old hash and the new inode, mtime and size
+        for path, (_, _, _, fileHash) in graph["files"].items():
+            if hashFile(path) != fileHash:
+                self.logger.debug(f"Not saving dependency index: {path}")
+                return
+        os.makedirs(os.path.dirname(self.indexPath), exist_ok=True)
+        tmpPath = f"{self.indexPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(graph, f)
+        os.replace(tmpPath, self.indexPath)
+
+    def _setGraph(self, graph):
+        self.mapBasePkgToBuildRequires = {}
+        self.mapBasePkgToDependents = {}
+        for basePkg, entry in graph["basePkgs"].items():
+            self.mapBasePkgToBuildRequires[basePkg] = entry["buildRequires"]
+            for requiredBasePkg in entry["requiredBasePkgs"]:
+                self.mapBasePkgToDependents.setdefault(
+                    requiredBasePkg, []
+                ).append(basePkg)
+
+        self.mapPkgToBasePkg = {}
+        self.mapPkgToRequires = {}
+        self.mapPkgToDependents = {}
+        for pkg, (basePkg, requires) in graph["pkgs"].items():
+            self.mapPkgToBasePkg[pkg] = basePkg
+            self.mapPkgToRequires[pkg] = requires
+            for requiredPkg in dict.fromkeys(requires):
+                self.mapPkgToDependents.setdefault(requiredPkg, []).append(
+                    pkg
+                )
+        self.mapPackageToHighestVersion = graph["highestVersions"]
+        self.mapSpecFileNameToBasePkg = graph["specFileNames"]
+
+    # Returns "name-version" of given package name or "name-version"
+    def getPkg(self, package):
+        if package in self.mapPkgToRequires:
+            return package
+        version = self.mapPackageToHighestVersion.get(package)
+        if version is None:
+            raise Exception(f"Invalid package: {package}")
+        return f"{package}-{version}"
+
+    def getBasePkg(self, package):
+        return self.mapPkgToBasePkg[self.getPkg(package)]
+
+    def getRequires(self, package):
+        return self.mapPkgToRequires[self.getPkg(package)]
+
+    # Returns packages which Require given package, like who-needs
+    def getDependents(self, package):
+        return self.mapPkgToDependents.get(self.getPkg(package), [])
+
+    """
+    Breadth-first tree of the Requires of given package, as a map of
+    package to the packages it pulls in first. With build set, the
+    BuildRequires of its base package are part of the tree as well, like
+    for SpecData.getRequiresTreeForPkg.
+    """
+
+    def getRequiresTree(self, package, build=False):
+        pkg = self.getPkg(package)
+        return self._getTree(pkg, self.mapPkgToRequires, build)
+
+    # Breadth-first tree of the packages which Require given package,
+    # transitively
+    def getDependentsTree(self, package):
+        return self._getTree(self.getPkg(package), self.mapPkgToDependents)
+
+    def _getStartEdges(self, pkg, edges, build):
+        if not build:
+            return edges.get(pkg, [])
+        basePkg = self.mapPkgToBasePkg[pkg]
+        return self.mapBasePkgToBuildRequires[basePkg] + edges.get(pkg, [])
+
+    def _getTree(self, pkg, edges, build=False):
+        tree = {}
+        seen = {pkg}
+        pending = deque([pkg])
+        while pending:
+            current = pending.popleft()
+            if current == pkg:
+                nextPkgs = self._getStartEdges(pkg, edges, build)
+            else:
+                nextPkgs = edges.get(current, [])
+            for nextPkg in nextPkgs:
+                if nextPkg not in seen:
+                    seen.add(nextPkg)
+                    tree.setdefault(current, []).append(nextPkg)
+                    pending.append(nextPkg)
+        return tree
+
+    """
+    Returns a shortest chain of Requires from source to target, both
+    included, or None if source does not pull in target. With build set,
+    the chain may start with a BuildRequires of the base package of
+    source.
+    """
+
+    def getPath(self, source, target, build=False):
+        sourcePkg = self.getPkg(source)
+        targetPkg = self.getPkg(target)
+        parent = {sourcePkg: None}
+        pending = deque([sourcePkg])
+        while pending:
+            current = pending.popleft()
+            if current == targetPkg:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+            if current == sourcePkg:
+                nextPkgs = self._getStartEdges(
+                    sourcePkg, self.mapPkgToRequires, build
+                )
+            else:
+                nextPkgs = self.mapPkgToRequires.get(current, [])
+            for nextPkg in nextPkgs:
+                if nextPkg not in parent:
+                    parent[nextPkg] = current
+                    pending.append(nextPkg)
+        return None
+
+    """
+    Returns the sorted list of packages given packages pull in, including
+    them. Unknown package names are skipped, like SpecDeps does for the
+    package lists of images.
+    """
+
+    def getClosure(self, listPackages):
+        closure = set()
+        pending = []
+        for package in listPackages:
+            try:
+                pending.append(self.getPkg(package))
+            except Exception:
+                self.logger.info(f"Could not find spec for: {package}")
+        while pending:
+            pkg = pending.pop()
+            if pkg in closure:
+                continue
+            closure.add(pkg)
+            pending.extend(self.mapPkgToRequires.get(pkg, []))
+        return sorted(closure)
+
+    # Returns the closure of the packages of given package list file, like
+    # packages_minimal.json
+    def getImageClosure(self, jsonFile):
+        with open(jsonFile) as f:
+            data = json.load(f)
+        listPackages = data["packages"]
+        listPackages += data.get(f"packages_{constants.buildArch}", [])
+        return self.getClosure(listPackages)
+
+    """
+    Returns the base packages of given spec file names, separated by ':',
+    followed by all base packages which need them to be built or
+    installed, transitively. Same as SpecDeps get-upward-deps.
+    """
+
+    def getUpwardDeps(self, specFileNames):
+        whoNeeds = []
+        for specFileName in specFileNames.split(":"):
+            basePkg = self.mapSpecFileNameToBasePkg.get(specFileName)
+            if basePkg is not None:
+                whoNeeds.append(basePkg)
+        setWhoNeeds = set(whoNeeds)
+        pending = deque(whoNeeds)
+        while pending:
+            basePkg = pending.popleft()
+            for dependent in self.mapBasePkgToDependents.get(basePkg, []):
+                if dependent not in setWhoNeeds:
+                    setWhoNeeds.add(dependent)
+                    whoNeeds.append(dependent)
+                    pending.append(dependent)
+        return whoNeeds
+
+    def printTree(self, tree, root, depth=0):
+        self.logger.info("\t" * depth + root)
+        for child in tree.get(root, []):
+            self.printTree(tree, child, depth + 1)
+
+
+def main():
+    usage = "Usage: %prog [options]"
+    parser = ArgumentParser(usage)
+    parser.add_argument(
+        "-i",
+        "--input-type",
+        dest="input_type",
+        choices=[
+            "tree",
+            "build-tree",
+            "reverse-tree",
+            "who-needs",
+            "why",
+            "image",
+            "upward-deps",
+        ],
+        default="tree",
+    )
+    parser.add_argument(
+        "-p",
+        "--pkg",
+        dest="pkg",
+        help="package, spec file names for upward-deps, package list "
+        "name (e.g. minimal) for image",
+    )
+    parser.add_argument(
+        "-d",
+        "--dependency",
+        dest="dependency",
+        help="package pulled in by pkg, for why",
+    )
+    parser.add_argument(
+        "-b",
+        "--build",
+        dest="build",
+        action="store_true",
+        help="include BuildRequires of pkg, for why",
+    )
+    parser.add_argument(
+        "-s", "--spec-path", dest="spec_path", default=SPEC_FILE_DIR
+    )
+    parser.add_argument(
+        "-l", "--log-path", dest="log_path", default=LOG_FILE_DIR
+    )
+    parser.add_argument("-y", "--log-level", dest="log_level", default="info")
+    parser.add_argument(
+        "-c", "--build-cache-path", dest="build_cache_path", default=""
+    )
+    parser.add_argument("-a", "--data-dir", dest="data_dir", default=DATA_DIR)
+    options = parser.parse_args()
+
+    constants.setSpecPath(options.spec_path)
+    constants.setLogPath(options.log_path)
+    constants.setLogLevel(options.log_level)
+    constants.setBuildCachePath(options.build_cache_path)
+    constants.initialize()
+
+    logger = Logger.getLogger(
+        "DependencyIndex", options.log_path, options.log_level
+    )
+    try:
+        depIndex = DependencyIndex()
+        if options.input_type == "tree":
+            pkg = depIndex.getPkg(options.pkg)
+            depIndex.printTree(depIndex.getRequiresTree(pkg), pkg)
+        elif options.input_type == "build-tree":
+            pkg = depIndex.getPkg(options.pkg)
+            depIndex.printTree(depIndex.getRequiresTree(pkg, True), pkg)
+        elif options.input_type == "reverse-tree":
+            pkg = depIndex.getPkg(options.pkg)
+            depIndex.printTree(depIndex.getDependentsTree(pkg), pkg)
+        elif options.input_type == "who-needs":
+            logger.info(depIndex.getDependents(options.pkg))
+        elif options.input_type == "why":
+            path = depIndex.getPath(
+                options.pkg, options.dependency, options.build
+            )
+            if path is None:
+                logger.info(
+                    f"{options.pkg} does not pull in {options.dependency}"
+                )
+            else:
+                logger.info(" -> ".join(path))
+        elif options.input_type == "image":
+            jsonFile = os.path.join(
+                options.data_dir, f"packages_{options.pkg}.json"
+            )
+            logger.info(depIndex.getImageClosure(jsonFile))
+        elif options.input_type == "upward-deps":
+            logger.info(
+                "Upward dependencies: "
+                f"{depIndex.getUpwardDeps(options.pkg)}"
+            )
+    except Exception as e:
+        traceback.print_exc()
+        sys.stderr.write(str(e))
+        sys.exit(1)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import re
+
+from constants import constants
+
+MACRO_PATTERN = re.compile(r"%{(\S+?)\}")
+
+
+class MacroEngine(object):
+    """
+    Expands rpm macros in strings of a spec file.
+
+    Macros are looked up in three scopes: the definitions of the spec file,
+    the user defined macros and the macros of the package build options.
+    Expansion is done in two passes over the string:
+
+    - plain '%name' references of user macros and definitions, the first
+      macro (user macros first, then definitions, each in order of
+      definition) whose name matches at a position wins
+    - '%{name}', '%{?name}', '%{?name:value}', '%{!?name:value}' references,
+      where definitions take precedence over user macros, which take
+      precedence over build option macros
+
+    The scopes are compiled into lookup tables when first needed after a
+    change, and expanded strings are memoized until the next change.
+    """
+
+    def __init__(self):
+        self.defs = {}
+        self.userMacros = dict(constants.userDefinedMacros)
+        self.buildOptionMacros = {}
+        # names of all macros looked up so far, defined or not
+        self.referenced = set()
+
+        self._plainMacros = None
+        self._plainNameLengths = None
+        self._macros = None
+        self._expanded = {}
+
+    def define(self, name, value):
+        self.defs[name] = value
+        self._invalidate()
+
+    def setPackageName(self, packageName):
+        self.buildOptionMacros = constants.getAdditionalMacros(packageName)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._plainMacros = None
+        self._macros = None
+        self._expanded = {}
+
+    def _compile(self):
+        ordered = list(self.userMacros.items()) + list(self.defs.items())
+
+        # map name to (order, value) of the first macro with this name.
+        # A value is already run through all the macros following it, as
+        # if they were replaced one after another.
+        plainMacros = {}
+        for order, (name, value) in enumerate(ordered):
+            if name in plainMacros:
+                continue
+            if "%" in value:
+                for later, laterValue in ordered[order + 1 :]:  # noqa: E203
+                    value = value.replace(f"%{later}", laterValue)
+            plainMacros[name] = (order, value)
+        self._plainMacros = plainMacros
+        self._plainNameLengths = sorted({len(name) for name in plainMacros})
+
+        self._macros = {**self.buildOptionMacros, **self.userMacros}
+        self._macros.update(self.defs)
+
+    def _expandPlain(self, string):
+        result = []
+        start = 0
+        pos = string.find("%")
+        while pos != -1:
+            match = None
+            for length in self._plainNameLengths:
+                name = string[pos + 1 : pos + 1 + length]  # noqa: E203
+                if len(name) < length:
+                    break
+                entry = self._plainMacros.get(name)
+                if entry and (match is None or entry[0] < match[1][0]):
+                    match = (name, entry)
+            if match is None:
+                pos = string.find("%", pos + 1)
+                continue
+            name, (_, value) = match
+            self.referenced.add(name)
+            result.append(string[start:pos])
+            result.append(value)
+            start = pos + 1 + len(name)
+            pos = string.find("%", start)
+        result.append(string[start:])
+        return "".join(result)
+
+    def _replaceMacro(self, match):
+        macro = match.group(1)
+        if macro[0] in "?!":
+            parts = macro[1:].split(":")
+            self.referenced.add(parts[0])
+            defined = parts[0] in self._macros
+            if macro[0] == "?":
+                if not defined:
+                    return ""
+                if len(parts) == 2:
+                    return parts[1]
+                return self._macros[parts[0]]
+            if not defined and len(parts) == 2:
+                return parts[1]
+            return ""
+
+        self.referenced.add(macro)
+        if macro in self._macros:
+            return self._macros[macro]
+        return match.group(0)
+
+    def expand(self, string):
+        """
+        Replace all macros in given string with corresponding values.
+
+        For example: a string '%{name}-%{version}.tar.gz' will be
+        transformed to 'foo-2.0.tar.gz'.
+
+        :return A string where all macros in given input are substituted
+        as good as possible.
+        """
+        if string in self._expanded:
+            return self._expanded[string]
+        if self._macros is None:
+            self._compile()
+
+        expanded = string
+        if "%" in string:
+            expanded = MACRO_PATTERN.sub(
+                self._replaceMacro, self._expandPlain(string)
+            )
+        self._expanded[string] = expanded
+        return expanded
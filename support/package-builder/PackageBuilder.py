@@ -21,6 +21,9 @@ class PackageBuilder(object):
         self.package = None
         self.version = None
         self.doneList = None
+        self.numJobs = None
+        # resource usage of the build, if measured
+        self.buildUsage = None
         self.sandboxType = sandboxType
         self.sandbox = None
         self.cmdUtils = CommandUtils()
@@ -44,7 +47,7 @@ class PackageBuilder(object):
             "go",
         ]
 
-    def build(self, pkg, doneList):
+    def build(self, pkg, doneList, numJobs=None):
         packageName, packageVersion = StringUtils.splitPackageNameAndVersion(
             pkg
         )
@@ -61,6 +64,7 @@ class PackageBuilder(object):
         self._buildPackagePrepareFunction(
             packageName, packageVersion, doneList
         )
+        self.numJobs = numJobs
         try:
             self._buildPackage()
         except Exception as e:
@@ -95,8 +99,13 @@ class PackageBuilder(object):
             pkgUtils = PackageUtils(self.logName, self.logPath)
             pkgUtils.adjustGCCSpecs(self.sandbox, self.package, self.version)
             pkgUtils.buildRPMSForGivenPackage(
-                self.sandbox, self.package, self.version, self.logPath
+                self.sandbox,
+                self.package,
+                self.version,
+                self.logPath,
+                self.numJobs,
             )
+            self.buildUsage = pkgUtils.buildUsage
             self.logger.debug(
                 f"Successfully built the package: {self.package}"
             )
@@ -255,6 +255,7 @@ class PackageManager(object):
         else:
             statusEvent = threading.Event()
             self._initializeScheduler(statusEvent)
+            Scheduler.setNumWorkers(buildThreads)
             self._initializeThreadPool(statusEvent)
             for i in range(0, buildThreads):
                 workerName = f"WorkerThread{i}"
@@ -262,9 +263,10 @@ class PackageManager(object):
                 ThreadPool.startWorkerThread(workerName)
 
             statusEvent.wait()
-            Scheduler.stopScheduling = True
+            Scheduler.stop()
             self.logger.debug("Waiting for all remaining worker threads")
             ThreadPool.join_all()
+            ThreadPool.logUtilization()
 
         setFailFlag = False
         allPackagesBuilt = False
@@ -277,6 +279,8 @@ class PackageManager(object):
         if setFailFlag:
             self.logger.error("Some of the packages failed:")
             self.logger.error(Scheduler.listOfFailedPackages)
+            if constants.keepGoing:
+                self._logBlockedPackages()
             raise Exception("Failed during building package")
 
         if not setFailFlag:
@@ -286,6 +290,19 @@ class PackageManager(object):
                 self.logger.error("Build stopped unexpectedly.Unknown error.")
                 raise Exception("Unknown error")
 
+    def _logBlockedPackages(self):
+        blockedPackages = Scheduler.getBlockedPackages()
+        numBlocked = sum(len(v) for v in blockedPackages.values())
+        self.logger.error(
+            f"{len(blockedPackages)} packages failed, {numBlocked} packages "
+            "were not built because they depend on failed ones:"
+        )
+        for failedPackage, listBlocked in blockedPackages.items():
+            self.logger.error(
+                f"{failedPackage}: blocks {len(listBlocked)} packages"
+                + (f": {' '.join(listBlocked)}" if listBlocked else "")
+            )
+
     def _createBuildContainer(self, usePublishedRPMs):
         self.logger.debug("Generating photon build container..")
         try:
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import os
+import time
 import PullSources
 
 from CommandUtils import CommandUtils
@@ -38,6 +39,8 @@ class PackageUtils(object):
         self.replaceRpmPackageOptions = "--replacepkgs"
         self.adjustGCCSpecScript = "adjust-gcc-specs.sh"
         self.rpmFilesToInstallInAOneShot = ""
+        # resource usage of the last rpmbuild, see _buildRPM()
+        self.buildUsage = None
         self.packagesToInstallInAOneShot = ""
         self.noDepsRPMFilesToInstallInAOneShot = ""
         self.noDepsPackagesToInstallInAOneShot = ""
@@ -105,7 +108,9 @@ class PackageUtils(object):
                 self.logger.error("Unable to install rpms")
                 raise Exception("RPM installation failed")
 
-    def buildRPMSForGivenPackage(self, sandbox, package, version, destLogPath):
+    def buildRPMSForGivenPackage(
+        self, sandbox, package, version, destLogPath, numJobs=None
+    ):
         self.logger.info(f"Building package: {package}")
 
         listSourcesFiles = SPECS.getData().getSources(package, version)
@@ -153,6 +158,7 @@ class PackageUtils(object):
                 package,
                 version,
                 macros,
+                numJobs,
             )
 
             if constants.rpmCheck:
@@ -369,7 +375,15 @@ class PackageUtils(object):
             macros.extend(pkg["macros"])
         return pullsources_urls, macros
 
-    def _buildRPM(self, sandbox, specFile, logFile, package, version, macros):
+    """
+    numJobs, if given, is the number of parallel jobs of the build, passed
+    as _smp_mflags. The resource usage of the build is left in
+    self.buildUsage, if the sandbox measures it.
+    """
+
+    def _buildRPM(
+        self, sandbox, specFile, logFile, package, version, macros, numJobs
+    ):
         make_check_na = False
         rpmBuildcmd = f"{self.rpmbuildBinary} {self.rpmbuildBuildallOption}"
 
@@ -411,6 +425,12 @@ class PackageUtils(object):
         else:
             rpmBuildcmd += f" {self.rpmbuildNocheckOption}"
 
+        if numJobs:
+            rpmBuildcmd += (
+                f' -D "_smp_build_ncpus {numJobs}"'
+                f' -D "_smp_mflags -j{numJobs}"'
+            )
+
         for macro in macros:
             rpmBuildcmd += f' -D "{macro}"'
 
@@ -425,7 +445,12 @@ class PackageUtils(object):
 
         self.logger.debug(f"Building rpm....\n{rpmBuildcmd}")
 
-        returnVal = sandbox.run(rpmBuildcmd, logfile=logFile)
+        usage = {}
+        startTime = time.monotonic()
+        returnVal = sandbox.run(rpmBuildcmd, logfile=logFile, usage=usage)
+        if usage:
+            usage["wallTime"] = time.monotonic() - startTime
+            self.buildUsage = usage
 
         if constants.rpmCheck and package in constants.testForceRPMS:
             if make_check_na:
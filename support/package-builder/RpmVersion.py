@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+Version comparison following rpm's rules (rpmvercmp):
+
+- a version is split into alphabetic and numeric segments, any other
+  character only separates segments
+- numeric segments compare as numbers and are newer than alphabetic ones
+- alphabetic segments compare as strings
+- '~' sorts before anything, even the end of the version (1.0~rc1 < 1.0)
+- '^' sorts after the end of the version but before any other segment
+  (1.0 < 1.0^git1 < 1.0.1)
+- if all segments compare equal, the version with segments left is newer
+
+Versions are turned into keys once (the keys are cached), which compare
+like the versions do. The keys can be used to sort or bisect lists of
+versions.
+"""
+
+import re
+
+from functools import lru_cache
+
+SEGMENT_PATTERN = re.compile(r"~|\^|[0-9]+|[a-zA-Z]+")
+
+# Segment kinds, in sort order
+TILDE = (0,)
+END = (1,)
+CARET = (2,)
+ALPHA = 3
+NUMERIC = 4
+
+
+@lru_cache(maxsize=None)
+def versionKey(version):
+    key = []
+    for segment in SEGMENT_PATTERN.findall(version):
+        if segment == "~":
+            key.append(TILDE)
+        elif segment == "^":
+            key.append(CARET)
+        elif segment[0].isdigit():
+            key.append((NUMERIC, int(segment)))
+        else:
+            key.append((ALPHA, segment))
+    key.append(END)
+    return tuple(key)
+
+
+"""
+Returns key of [epoch:]version[-release]. A missing epoch is 0, a
+missing release sorts before any release.
+"""
+
+
+@lru_cache(maxsize=None)
+def evrKey(evr):
+    epoch, version, release = splitEvr(evr)
+    releaseKey = (0,) if release is None else (1, versionKey(release))
+    return epoch, versionKey(version), releaseKey
+
+
+def splitEvr(evr):
+    epoch = 0
+    colon = evr.find(":")
+    if colon != -1 and evr[:colon].isdigit():
+        epoch = int(evr[:colon])
+        evr = evr[colon + 1 :]  # noqa: E203
+    version, sep, release = evr.rpartition("-")
+    if not sep:
+        return epoch, release, None
+    return epoch, version, release
+
+
+def compareVersions(a, b):
+    keyA = versionKey(a)
+    keyB = versionKey(b)
+    return (keyA > keyB) - (keyA < keyB)
+
+
+def compareEvrs(a, b):
+    keyA = evrKey(a)
+    keyB = evrKey(b)
+    return (keyA > keyB) - (keyA < keyB)
+
+
+"""
+Checks whether a package of given [epoch:]version-release satisfies a
+dependency "<compare> <evr>", where compare is one of =, <, >, <=, >=.
+Like rpm, the release is only compared if the dependency has one.
+"""
+
+
+def satisfies(evr, compare, dependencyEvr):
+    epoch, version, release = evrKey(evr)
+    depEpoch, depVersion, depRelease = evrKey(dependencyEvr)
+    if depRelease == (0,):
+        release = depRelease
+    key = (epoch, version, release)
+    depKey = (depEpoch, depVersion, depRelease)
+    if compare == "=":
+        return key == depKey
+    if compare == "<":
+        return key < depKey
+    if compare == ">":
+        return key > depKey
+    if compare == "<=":
+        return key <= depKey
+    if compare == ">=":
+        return key >= depKey
+    raise Exception(f"Unknown version comparison: {compare}")
@@ -106,11 +106,12 @@ class Chroot(Sandbox):
         self._unmountAll(chrootID)
         self._removeChroot(chrootID)
 
-    def run(self, cmd, logfile=None, logfn=None):
+    # usage, if given, is filled as by CommandUtils.runBashCmd()
+    def run(self, cmd, logfile=None, logfn=None, usage=None):
         self.logger.debug(f"Chroot.run() cmd: {self.chrootCmdPrefix}{cmd}")
         cmd = cmd.replace('"', '\\"')
         (_, _, retval) = self.cmdUtils.runBashCmd(
-            f"{self.chrootCmdPrefix}{cmd}", logfile, logfn
+            f"{self.chrootCmdPrefix}{cmd}", logfile, logfn, usage=usage
         )
         return retval
 
@@ -239,7 +240,8 @@ class Container(Sandbox):
         )
         self.containerID = containerID
 
-    def run(self, cmd, logfile=None, logfn=None):
+    # usage is not measured in containers
+    def run(self, cmd, logfile=None, logfn=None, usage=None):
         result = self.containerID.exec_run(cmd)
         if result.output:
             if logfn:
@@ -1,15 +1,35 @@
 #!/usr/bin/env python3
 
+import os
 import json
+import math
+import heapq
+import hashlib
 import threading
 
-from queue import PriorityQueue
-from ThreadPool import ThreadPool
+from BuildResources import BuildResources
 from constants import constants
 from Logger import Logger
+from PackageBuildDataGenerator import PackageBuildDataGenerator
+from SpecCache import PARSER_MODULES, getConfigDigest, hashFile
 from SpecData import SPECS
 from StringUtils import StringUtils
 
+# Modules whose code affects the dependency graph, besides the parser
+GRAPH_MODULES = PARSER_MODULES + [
+    "SpecData.py",
+    "DependencyClosure.py",
+    "Scheduler.py",
+]
+
+# Number of dependency graphs of different package lists, weights or
+# spec files kept per arch
+MAX_CACHED_GRAPHS = 8
+
+# Factor by which the critical-chain weight of a package must exceed that
+# of the next ready package for the package to be on the critical chain
+CRITICAL_CHAIN_LEAD = 2
+
 
 class DependencyGraphNode(object):
     def __init__(self, packageName, packageVersion, pkgWeight):
@@ -68,16 +88,31 @@ class DependencyGraphNode(object):
         # Internal flag to check if the package is built
         self.built = 0
 
+        # While the package is waiting to be built: the number of its
+        # dependencies which are not built yet, and the nodes of the
+        # packages waiting for it in turn
+        self.numUnbuiltDependencies = 0
+        self.waitingPkgNodes = []
+
 
 class Scheduler(object):
 
     lock = threading.Lock()
+    # notified whenever packages may have become ready to build, or
+    # scheduling stopped
+    condition = threading.Condition(lock)
     listOfAlreadyBuiltPackages = set()
-    listOfPackagesToBuild = []
+    listOfPackagesToBuild = set()
     listOfPackagesCurrentlyBuilding = set()
     sortedList = []
-    listOfPackagesNextToBuild = PriorityQueue()
+    # heap of (-priority, package) of the packages ready to be built
+    listOfPackagesNextToBuild = []
     listOfFailedPackages = []
+    # map package not built in keep-going mode to the failed package it
+    # depends on
+    mapBlockedPackageToFailedPackage = {}
+    # packages being built whose spec file changed meanwhile
+    setStalePackages = set()
     priorityMap = {}
     pkgWeights = {}
     logger = None
@@ -85,11 +120,23 @@ class Scheduler(object):
     stopScheduling = False
     mapPackagesToGraphNodes = {}
     coreToolChainBuild = False
+    # resource profiles of the builds, None if builds do not run locally
+    resources = None
+    # map package being built to the cores and memory allocated to it
+    mapPackageToAllocation = {}
+    availableCpus = 0
+    availableMemory = 0
+    # number of worker threads building packages, 0 if unknown
+    numWorkers = 0
 
     @staticmethod
     def setEvent(event):
         Scheduler.event = event
 
+    @staticmethod
+    def setNumWorkers(numWorkers):
+        Scheduler.numWorkers = numWorkers
+
     @staticmethod
     def setLog(logName, logPath, logLevel):
         Scheduler.logger = Logger.getLogger(logName, logPath, logLevel)
@@ -106,11 +153,19 @@ class Scheduler(object):
                 pkg not in Scheduler.listOfAlreadyBuiltPackages
                 or pkgName in constants.testForceRPMS
             ):
-                Scheduler.listOfPackagesToBuild.append(pkg)
+                Scheduler.listOfPackagesToBuild.add(pkg)
 
         Scheduler.listOfPackagesCurrentlyBuilding = set()
-        Scheduler.listOfPackagesNextToBuild = PriorityQueue()
         Scheduler.listOfFailedPackages = []
+        Scheduler.mapBlockedPackageToFailedPackage = {}
+        Scheduler.setStalePackages = set()
+
+        Scheduler.resources = None
+        Scheduler.mapPackageToAllocation = {}
+        if not constants.startSchedulerServer:
+            Scheduler.resources = BuildResources()
+            Scheduler.availableCpus = Scheduler.resources.hostCpus
+            Scheduler.availableMemory = Scheduler.resources.hostMemory
 
         # When performing (only) make-check, package dependencies are
         # irrelevant; i.e., all the packages can be "make-checked" in
@@ -127,29 +182,50 @@ class Scheduler(object):
         # all the `make check`s in parallel.
         skipGraphBuild = constants.rpmCheck
         Scheduler._setPriorities(skipGraphBuild)
+        Scheduler._initReadyPackages()
 
         if constants.publishBuildDependencies:
             # This must be called only after calling _setPriorities(),
             # which builds the dependency graph.
             Scheduler._publishBuildDependencies()
 
+    # usage is the resource usage of the build, if it was measured
     @staticmethod
-    def notifyPackageBuildCompleted(package):
+    def notifyPackageBuildCompleted(package, usage=None):
         with Scheduler.lock:
             if package in Scheduler.listOfPackagesCurrentlyBuilding:
                 Scheduler.listOfPackagesCurrentlyBuilding.remove(package)
-                Scheduler.listOfAlreadyBuiltPackages.add(package)
-                if not constants.rpmCheck:
-                    Scheduler._markPkgNodeAsBuilt(package)
+                Scheduler._releaseResources(package, usage)
+                if package in Scheduler.setStalePackages:
+                    Scheduler._rescheduleStalePackage(package)
+                else:
+                    Scheduler.listOfAlreadyBuiltPackages.add(package)
+                    if not constants.rpmCheck:
+                        Scheduler._markPkgNodeAsBuilt(package)
                 Scheduler.printStatus()
+                Scheduler.condition.notify_all()
 
     @staticmethod
     def notifyPackageBuildFailed(package):
         with Scheduler.lock:
             if package in Scheduler.listOfPackagesCurrentlyBuilding:
                 Scheduler.listOfPackagesCurrentlyBuilding.remove(package)
-                Scheduler.listOfFailedPackages.append(package)
+                Scheduler._releaseResources(package)
+                if package in Scheduler.setStalePackages:
+                    Scheduler._rescheduleStalePackage(package)
+                else:
+                    Scheduler.listOfFailedPackages.append(package)
+                    if constants.keepGoing and not constants.rpmCheck:
+                        Scheduler._blockDependents(package)
+                    elif (
+                        not constants.keepGoing
+                        and Scheduler.event is not None
+                    ):
+                        # stops the scheduling of packages for all
+                        # workers, before any of them is woken up
+                        Scheduler.event.set()
                 Scheduler.printStatus()
+                Scheduler.condition.notify_all()
 
     @staticmethod
     def isAllPackagesBuilt():
@@ -172,41 +248,181 @@ class Scheduler(object):
     @staticmethod
     def getNextPackageToBuild():
         with Scheduler.lock:
-            if Scheduler.stopScheduling:
-                return None
+            return Scheduler._getNextPackageToBuild()
 
-            if not Scheduler.listOfPackagesToBuild:
-                if Scheduler.event is not None:
-                    Scheduler.event.set()
+    """
+    Blocking variant of getNextPackageToBuild() for the worker threads.
+    Waits while no package is ready but some are being built, as these
+    may make others ready. Returns None once scheduling stopped, the
+    status event is set (all packages are scheduled or a build failed) or
+    no package can become ready anymore.
+    """
 
-            if Scheduler.listOfPackagesNextToBuild.empty():
-                Scheduler._getListNextPackagesReadyToBuild()
+    @staticmethod
+    def waitNextPackageToBuild():
+        with Scheduler.lock:
+            while True:
+                if Scheduler.event is not None and Scheduler.event.is_set():
+                    return None
+                package = Scheduler._getNextPackageToBuild()
+                if package is not None or Scheduler.stopScheduling:
+                    return package
+                if not Scheduler.listOfPackagesCurrentlyBuilding:
+                    if Scheduler.event is not None:
+                        Scheduler.event.set()
+                    return None
+                Scheduler.condition.wait()
 
-            if Scheduler.listOfPackagesNextToBuild.empty():
+    @staticmethod
+    def stop():
+        with Scheduler.lock:
+            Scheduler.stopScheduling = True
+            Scheduler.condition.notify_all()
+
+    @staticmethod
+    def _getNextPackageToBuild():
+        if Scheduler.stopScheduling:
+            return None
+
+        if not Scheduler.listOfPackagesToBuild:
+            if Scheduler.event is not None:
+                Scheduler.event.set()
+
+        if not Scheduler.listOfPackagesNextToBuild:
+            return None
+
+        _, package = Scheduler.listOfPackagesNextToBuild[0]
+        if not Scheduler._allocateResources(package):
+            return None
+        heapq.heappop(Scheduler.listOfPackagesNextToBuild)
+        Scheduler.listOfPackagesCurrentlyBuilding.add(package)
+        Scheduler.listOfPackagesToBuild.remove(package)
+        Scheduler.printStatus()
+        return package
+
+    # Returns the number of parallel jobs to build given package with,
+    # None if it is up to the build
+    @staticmethod
+    def getNumBuildJobs(package):
+        with Scheduler.lock:
+            allocation = Scheduler.mapPackageToAllocation.get(package)
+            if allocation is None:
                 return None
+            return allocation[0]
 
-            packageTup = Scheduler.listOfPackagesNextToBuild.get()
+    """
+    Builds are packed into the cores and memory of the host. Memory is
+    allocated as given by the resource profiles. The package with the
+    highest priority waits until its memory fits and a core is free, so
+    that lower priority packages cannot delay it indefinitely. A build
+    always fits if nothing else is being built.
+
+    The number of cores, which is the -j of the build, is chosen at that
+    point. The free cores are shared among the ready packages which can
+    start now, that is not more of them than there are idle workers:
+    - A package on the current critical chain gets the free cores but
+      one for each other package sharing them. Its critical-chain weight
+      is not lower than that of any package being built, and at least
+      CRITICAL_CHAIN_LEAD times that of the next ready package. If it has
+      a profile, it gets at most twice its profile, which leaves cores to
+      the builds which can use them.
+    - Any other package gets an even share of the free cores, but not
+      more than its profile if it has one. So when few packages are
+      ready they get most of the cores, and wide phases run as many
+      builds as there are workers, with a lower -j.
+    Beyond its profile, a build is allocated memory in proportion to its
+    cores, and without profile SEED_MEMORY_PER_CPU per core. It gets no
+    more cores than that memory fits for.
+    """
 
-            package = packageTup[1]
-            if (
-                not constants.startSchedulerServer
-                and Scheduler.listOfPackagesNextToBuild.qsize() > 0
-            ):
-                ThreadPool.activateWorkerThreads(
-                    Scheduler.listOfPackagesNextToBuild.qsize()
-                )
-            Scheduler.listOfPackagesCurrentlyBuilding.add(package)
-            Scheduler.listOfPackagesToBuild.remove(package)
-            Scheduler.printStatus()
-            return package
+    @staticmethod
+    def _allocateResources(package):
+        if Scheduler.resources is None:
+            return True
+        profileCpus, memory = Scheduler.resources.getAllocation(package)
+        freeCpus = Scheduler.availableCpus
+        if freeCpus < 1 or memory > Scheduler.availableMemory:
+            return False
+
+        numReady = len(Scheduler.listOfPackagesNextToBuild)
+        numIdleWorkers = numReady
+        if Scheduler.numWorkers:
+            numIdleWorkers = max(
+                1,
+                Scheduler.numWorkers
+                - len(Scheduler.listOfPackagesCurrentlyBuilding),
+            )
+        numSharing = min(numReady, numIdleWorkers)
+        share = max(1, freeCpus // numSharing)
+        priority = Scheduler._getPriority(package)
+        highestBuildingPriority = max(
+            map(Scheduler._getPriority, Scheduler.mapPackageToAllocation),
+            default=0,
+        )
+        # the children of the heap top are the next ready packages
+        nextReadyPriority = -min(
+            Scheduler.listOfPackagesNextToBuild[1:3], default=(0, None)
+        )[0]
+        critical = (
+            priority > 0
+            and priority >= highestBuildingPriority
+            and priority >= CRITICAL_CHAIN_LEAD * nextReadyPriority
+        )
+        if critical:
+            cpus = max(share, freeCpus - (numSharing - 1))
+            if profileCpus is not None:
+                cpus = min(cpus, 2 * profileCpus)
+        elif profileCpus is None:
+            cpus = share
+        else:
+            cpus = max(1, min(share, profileCpus))
+
+        # without profile memory is that of one core
+        baseCpus = profileCpus or 1
+        if cpus > baseCpus:
+            memoryPerCpu = memory / baseCpus
+            cpus = min(
+                cpus,
+                baseCpus
+                + int((Scheduler.availableMemory - memory) // memoryPerCpu),
+            )
+            memory = math.ceil(memory * cpus / baseCpus)
+
+        Scheduler.availableCpus -= cpus
+        Scheduler.availableMemory -= memory
+        Scheduler.mapPackageToAllocation[package] = (cpus, memory)
+        Scheduler.logger.info(
+            f"Build jobs for {package}: -j{cpus}, "
+            f"{'on' if critical else 'off'} the critical chain "
+            f"(critical-chain weight {priority}, highest building "
+            f"{highestBuildingPriority}, next ready {nextReadyPriority}), "
+            f"ready packages: {numReady}, "
+            f"idle workers: {numIdleWorkers}, free cores: {freeCpus}, "
+            f"profile cores: {profileCpus}, "
+            f"memory: {memory} MiB"
+        )
+        return True
+
+    @staticmethod
+    def _releaseResources(package, usage=None):
+        allocation = Scheduler.mapPackageToAllocation.pop(package, None)
+        if allocation is None:
+            return
+        cpus, memory = allocation
+        Scheduler.availableCpus += cpus
+        Scheduler.availableMemory += memory
+        if usage:
+            Scheduler.resources.update(package, cpus, usage)
+            Scheduler.resources.save()
 
     @staticmethod
     def printStatus():
         Scheduler.logger.info(
-            "Package Status: Total: {} Building: {} Broken: {} Pending: {} Done: {}".format(  # noqa: E501
+            "Package Status: Total: {} Building: {} Broken: {} Blocked: {} Pending: {} Done: {}".format(  # noqa: E501
                 len(Scheduler.sortedList),
                 len(Scheduler.listOfPackagesCurrentlyBuilding),
                 len(Scheduler.listOfFailedPackages),
+                len(Scheduler.mapBlockedPackageToFailedPackage),
                 len(Scheduler.listOfPackagesToBuild),
                 len(Scheduler.listOfAlreadyBuiltPackages),
             )
@@ -216,6 +432,125 @@ class Scheduler(object):
     def getDoneList():
         return list(Scheduler.listOfAlreadyBuiltPackages)
 
+    # Returns map of failed package to the sorted list of packages which
+    # were not built because they depend on it
+    @staticmethod
+    def getBlockedPackages():
+        blockedPackages = {p: [] for p in Scheduler.listOfFailedPackages}
+        for package, failedPackage in sorted(
+            Scheduler.mapBlockedPackageToFailedPackage.items()
+        ):
+            blockedPackages[failedPackage].append(package)
+        return blockedPackages
+
+    """
+    In keep-going mode, the packages waiting for a failed package,
+    directly or through other packages, are never built. They are removed
+    from the packages to build, so that scheduling ends once everything
+    else is built.
+    """
+
+    @staticmethod
+    def _blockDependents(failedPackage):
+        pkgNode = Scheduler.mapPackagesToGraphNodes[failedPackage]
+        pkgNodesToVisit = list(pkgNode.waitingPkgNodes)
+        pkgNode.waitingPkgNodes = []
+        while pkgNodesToVisit:
+            pkgNode = pkgNodesToVisit.pop()
+            package = f"{pkgNode.packageName}-{pkgNode.packageVersion}"
+            if package in Scheduler.mapBlockedPackageToFailedPackage:
+                continue
+            Scheduler.mapBlockedPackageToFailedPackage[package] = (
+                failedPackage
+            )
+            Scheduler.listOfPackagesToBuild.discard(package)
+            pkgNodesToVisit.extend(pkgNode.waitingPkgNodes)
+            pkgNode.waitingPkgNodes = []
+
+    """
+    Picks up the changes of the spec files while packages are being built,
+    see SPECS.reload(). The scheduled packages are looked up again, in the
+    highest version if theirs is gone. Their build order, the dependency
+    graph and the priorities are computed again. Packages whose spec file
+    changed are built again: right away if they were built or failed, and
+    once their build ends if they are being built.
+
+    Returns the invalidated base packages ("name-version") and the new map
+    of package to cycle, None if the build order was not computed again.
+    """
+
+    @staticmethod
+    def reloadSpecs():
+        with Scheduler.lock:
+            invalidated = SPECS.reload().get(constants.currentArch, [])
+            if not invalidated:
+                return invalidated, None
+            specData = SPECS.getData()
+            listPackages = {}
+            for package in Scheduler.sortedList:
+                packageName, packageVersion = (
+                    StringUtils.splitPackageNameAndVersion(package)
+                )
+                if not specData.isRPMPackage(packageName):
+                    continue
+                if packageVersion not in specData.getVersions(packageName):
+                    packageVersion = specData.getHighestVersion(packageName)
+                listPackages[f"{packageName}-{packageVersion}"] = None
+
+            mapPackageToCycle = None
+            if constants.rpmCheck or Scheduler.coreToolChainBuild:
+                sortedList = list(listPackages)
+            else:
+                (
+                    _,
+                    mapPackageToCycle,
+                    sortedList,
+                ) = PackageBuildDataGenerator().getPackageBuildData(
+                    list(listPackages)
+                )
+
+            setInvalidated = set(invalidated)
+            Scheduler.listOfAlreadyBuiltPackages.difference_update(
+                setInvalidated
+            )
+            Scheduler.setStalePackages.update(
+                Scheduler.listOfPackagesCurrentlyBuilding & setInvalidated
+            )
+            Scheduler.listOfFailedPackages = [
+                p
+                for p in Scheduler.listOfFailedPackages
+                if p not in setInvalidated
+            ]
+            Scheduler.sortedList = sortedList
+            Scheduler.listOfPackagesToBuild = (
+                set(sortedList)
+                - Scheduler.listOfAlreadyBuiltPackages
+                - Scheduler.listOfPackagesCurrentlyBuilding
+                - set(Scheduler.listOfFailedPackages)
+            )
+            Scheduler.mapPackagesToGraphNodes = {}
+            Scheduler.priorityMap = {}
+            Scheduler.mapBlockedPackageToFailedPackage = {}
+            Scheduler._setPriorities(constants.rpmCheck)
+            Scheduler._initReadyPackages()
+            if constants.keepGoing and not constants.rpmCheck:
+                for package in Scheduler.listOfFailedPackages:
+                    if package in Scheduler.mapPackagesToGraphNodes:
+                        Scheduler._blockDependents(package)
+            Scheduler.printStatus()
+            Scheduler.condition.notify_all()
+            return invalidated, mapPackageToCycle
+
+    # Builds a package again whose spec file changed while it was built, if
+    # it is still to be built
+    @staticmethod
+    def _rescheduleStalePackage(package):
+        Scheduler.setStalePackages.remove(package)
+        if package not in Scheduler.priorityMap:
+            return
+        Scheduler.listOfPackagesToBuild.add(package)
+        Scheduler._addPackageToSchedule(package)
+
     @staticmethod
     def _publishBuildDependencies():
         Scheduler.logger.debug("Publishing Build dependencies")
@@ -656,6 +991,11 @@ class Scheduler(object):
                 pkgNode.numVisits = 0
 
     def _buildGraph():
+        graphPath = Scheduler._getGraphCachePath()
+        if graphPath and Scheduler._loadGraph(graphPath):
+            Scheduler.logger.debug(f"Loaded dependency graph {graphPath}")
+            return
+
         if Scheduler.coreToolChainBuild:
             Scheduler._createCoreToolChainGraphNodes()
         else:
@@ -664,6 +1004,117 @@ class Scheduler(object):
             Scheduler._calculateAllRequiredPackagesPerNode()
         Scheduler._calculateCriticalChainWeights()
 
+        if graphPath:
+            Scheduler._saveGraph(graphPath)
+
+    """
+    The graph only depends on the package list, the package weights and
+    the spec files it was built from, besides the code. It is persisted
+    below constants.buildCachePath under a digest of all of them, so that
+    resumed and repeated builds load it instead of building it again.
+    Whether packages are built already is not part of the graph.
+    Only the MAX_CACHED_GRAPHS graphs of the arch used last are kept.
+    """
+
+    @staticmethod
+    def _getGraphCachePath():
+        if not constants.buildCachePath:
+            return None
+        specData = SPECS.getData()
+        key = {
+            "config": getConfigDigest(specData.arch, GRAPH_MODULES),
+            "coreToolChainBuild": Scheduler.coreToolChainBuild,
+            "packages": Scheduler.sortedList,
+            "weights": hashFile(constants.packageWeightsPath),
+            "specFiles": specData.listSpecFiles,
+            "hashes": specData.mapSpecFileToHashes,
+        }
+        data = json.dumps(key, sort_keys=True).encode()
+        return os.path.join(
+            constants.buildCachePath,
+            "scheduler",
+            f"{specData.arch}-{hashlib.sha1(data).hexdigest()[:16]}.json",
+        )
+
+    @staticmethod
+    def _saveGraph(graphPath):
+        nodes = {}
+        for package in Scheduler.sortedList:
+            pkgNode = Scheduler.mapPackagesToGraphNodes[package]
+            nodes[package] = {
+                "children": sorted(
+                    f"{p.packageName}-{p.packageVersion}"
+                    for p in pkgNode.childPkgNodes
+                ),
+                "allRequiredPackages": pkgNode.allRequiredPackages,
+                "criticalChainWeight": pkgNode.criticalChainWeight,
+            }
+        os.makedirs(os.path.dirname(graphPath), exist_ok=True)
+        tmpPath = f"{graphPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(nodes, f)
+        os.replace(tmpPath, graphPath)
+        Scheduler._pruneGraphs(graphPath)
+
+    # Remove the least recently used graphs of the arch of given graph.
+    # Temporary files are left alone, they are being written by concurrent
+    # builds.
+    @staticmethod
+    def _pruneGraphs(graphPath):
+        graphDir = os.path.dirname(graphPath)
+        prefix = os.path.basename(graphPath).rsplit("-", 1)[0] + "-"
+        listGraphs = []
+        for entry in os.listdir(graphDir):
+            if not entry.startswith(prefix) or entry.endswith(".tmp"):
+                continue
+            path = os.path.join(graphDir, entry)
+            try:
+                listGraphs.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+        listGraphs.sort(reverse=True)
+        for _, path in listGraphs[MAX_CACHED_GRAPHS:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # removed by a concurrent build
+                pass
+
+    @staticmethod
+    def _loadGraph(graphPath):
+        try:
+            with open(graphPath) as f:
+                nodes = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            Scheduler.logger.debug(f"Ignoring broken dependency graph: {e}")
+            return False
+
+        Scheduler._createNodes()
+        try:
+            for package in Scheduler.sortedList:
+                pkgNode = Scheduler.mapPackagesToGraphNodes[package]
+                entry = nodes[package]
+                for childPkg in entry["children"]:
+                    childPkgNode = Scheduler.mapPackagesToGraphNodes[childPkg]
+                    pkgNode.childPkgNodes.add(childPkgNode)
+                    childPkgNode.parentPkgNodes.add(pkgNode)
+                pkgNode.allRequiredPackages.extend(
+                    entry["allRequiredPackages"]
+                )
+                pkgNode.criticalChainWeight = entry["criticalChainWeight"]
+        except KeyError as e:
+            Scheduler.logger.debug(f"Ignoring broken dependency graph: {e}")
+            Scheduler._createNodes()
+            return False
+        # mark as used, for pruning
+        try:
+            os.utime(graphPath)
+        except OSError:
+            pass
+        return True
+
     @staticmethod
     def _parseWeights():
         Scheduler.pkgWeights.clear()
@@ -716,33 +1167,65 @@ class Scheduler(object):
         Scheduler.logger.debug("set Priorities: Priority of all packages")
         Scheduler.logger.debug(Scheduler.priorityMap)
 
+    """
+    Packages are pushed to the heap of packages ready to be built as soon
+    as they are. Each package waiting to be built counts its dependencies
+    which are not built yet, and is registered with each of them. Marking a
+    package as built decrements the count of the packages waiting for it.
+    """
+
     @staticmethod
-    def _checkNextPackageIsReadyToBuild(package):
-        pkgNode = Scheduler.mapPackagesToGraphNodes[package]
+    def _getDependencyPkgNodes(pkgNode):
+        if Scheduler.coreToolChainBuild:
+            # For CoreToolchain list just use the graph
+            return pkgNode.childPkgNodes
+        # For the rest of the packages with parallel build we have to
+        # consider entire tree of dependencies cached in allRequiredPackages
+        return [
+            Scheduler.mapPackagesToGraphNodes[p]
+            for p in pkgNode.allRequiredPackages
+        ]
+
+    @staticmethod
+    def _initReadyPackages():
+        Scheduler.listOfPackagesNextToBuild = []
+        if not constants.rpmCheck:
+            for pkgNode in Scheduler.mapPackagesToGraphNodes.values():
+                pkgNode.waitingPkgNodes = []
+        for pkg in Scheduler.listOfPackagesToBuild:
+            Scheduler._addPackageToSchedule(pkg)
+
+    # Pushes given package to the heap of packages ready to be built, or
+    # registers it with its dependencies which are not built yet
+    @staticmethod
+    def _addPackageToSchedule(pkg):
+        if constants.rpmCheck:
+            Scheduler._pushReadyPackage(pkg)
+            return
+
+        pkgNode = Scheduler.mapPackagesToGraphNodes[pkg]
         if pkgNode.built == 1:
             Scheduler.logger.warning(
                 "This pkg %s-%s is already built,"
                 "but still present in listOfPackagesToBuild"
                 % (pkgNode.packageName, pkgNode.packageVersion)
             )
-            return False
-
-        if Scheduler.coreToolChainBuild:
-            # For CoreToolchain list just use the graph
-            for childPkgNode in pkgNode.childPkgNodes:
-                if childPkgNode.built == 0:
-                    return False
-        else:
-            """
-            For the rest of the packages with parallel build we have to
-            consider entire
-            tree of dependencies cached in allRequiredPackages set.
-            """
-            for p in pkgNode.allRequiredPackages:
-                if not Scheduler.mapPackagesToGraphNodes[p].built:
-                    return False
+            return
+        pkgNode.numUnbuiltDependencies = 0
+        for depPkgNode in Scheduler._getDependencyPkgNodes(pkgNode):
+            if not depPkgNode.built:
+                pkgNode.numUnbuiltDependencies += 1
+                depPkgNode.waitingPkgNodes.append(pkgNode)
+        if pkgNode.numUnbuiltDependencies == 0:
+            Scheduler._pushReadyPackage(pkg)
 
-        return True
+    @staticmethod
+    def _pushReadyPackage(pkg):
+        heapq.heappush(
+            Scheduler.listOfPackagesNextToBuild,
+            (-Scheduler._getPriority(pkg), pkg),
+        )
+        Scheduler.logger.debug(f"Adding {pkg} to the schedule list")
 
     @staticmethod
     def _markPkgNodeAsBuilt(package):
@@ -751,17 +1234,11 @@ class Scheduler(object):
             f"Marking pkgNode as built = {pkgNode.packageName}"
         )
         pkgNode.built = 1
-
-    @staticmethod
-    def _getListNextPackagesReadyToBuild():
-        for pkg in Scheduler.listOfPackagesToBuild:
-            if pkg in Scheduler.listOfPackagesCurrentlyBuilding:
-                continue
-            if (
-                constants.rpmCheck
-                or Scheduler._checkNextPackageIsReadyToBuild(pkg)
-            ):
-                Scheduler.listOfPackagesNextToBuild.put(
-                    (-Scheduler._getPriority(pkg), pkg)
+        for waitingPkgNode in pkgNode.waitingPkgNodes:
+            waitingPkgNode.numUnbuiltDependencies -= 1
+            if waitingPkgNode.numUnbuiltDependencies == 0:
+                Scheduler._pushReadyPackage(
+                    f"{waitingPkgNode.packageName}-"
+                    f"{waitingPkgNode.packageVersion}"
                 )
-                Scheduler.logger.debug(f"Adding {pkg} to the schedule list")
+        pkgNode.waitingPkgNodes = []
@@ -80,6 +80,18 @@ def getDoneList():
     return flask.jsonify(packages=doneList), SUCCESS
 
 
+@app.route("/reloadspecs/", methods=["POST"])
+def reloadSpecs():
+    logger.disabled = False
+    invalidated, mapCycles = Scheduler.reloadSpecs()
+    if mapCycles is not None:
+        mapPackageToCycle.clear()
+        mapPackageToCycle.update(mapCycles)
+    logger.info(f"Reloaded spec files, invalidated packages: {invalidated}")
+    logger.disabled = True
+    return flask.jsonify(invalidated), SUCCESS
+
+
 @app.route("/mappackagetocycle/", methods=["GET"])
 def getMapPackageToCycle():
     return mapPackageToCycle, SUCCESS
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import pickle
+import hashlib
+
+from constants import constants
+
+# Modules whose code affects the parsing result. A change in any of them
+# invalidates all cached entries.
+PARSER_MODULES = [
+    "SpecParser.py",
+    "MacroEngine.py",
+    "SpecCondition.py",
+    "RpmVersion.py",
+    "SpecStructures.py",
+    "StringUtils.py",
+    "constants.py",
+]
+
+
+def hashFile(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# Digest of what, besides the spec files, determines the result of
+# reading them: arch, user defined macros but ignoredMacros, build options
+# and the code of given modules
+def getConfigDigest(arch, modules=PARSER_MODULES, ignoredMacros=()):
+    srcDir = os.path.dirname(os.path.abspath(__file__))
+    config = {
+        "arch": arch,
+        "userDefinedMacros": {
+            k: v
+            for k, v in constants.userDefinedMacros.items()
+            if k not in ignoredMacros
+        },
+        "buildOptions": constants.buildOptions,
+        "parser": [hashFile(os.path.join(srcDir, m)) for m in modules],
+    }
+    data = json.dumps(config, sort_keys=True).encode()
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+class SpecCache(object):
+    """
+    On-disk cache of parsed SpecObjects.
+
+    Entries are kept per spec file in a directory specific to the arch,
+    the user defined macros, the build options and the parser code.
+    An entry is valid only while the content hash of the spec file and of
+    all its %include'd files match the recorded ones.
+    """
+
+    def __init__(self, arch, specFilesPath, logger):
+        self.arch = arch
+        self.specFilesPath = specFilesPath
+        self.logger = logger
+        self.cacheDir = None
+        self.configDigest = None
+        # map file to (inode, mtime, size) and content hash, for the files
+        # hashed during this run, shared by all entries
+        self.fileHashes = {}
+        self.hits = 0
+        self.misses = 0
+        # map spec file to the files it %include's, for the spec files
+        # read from or written to the cache during this run
+        self.mapSpecFileToIncludes = {}
+
+        if constants.buildCachePath:
+            self.configDigest = getConfigDigest(arch)
+            self.cacheDir = os.path.join(
+                constants.buildCachePath,
+                "specs",
+                f"{arch}-{self.configDigest}",
+            )
+            os.makedirs(self.cacheDir, exist_ok=True)
+
+    def _getEntryPath(self, specFile):
+        # spec files are found below specFilesPath, which saves the costly
+        # os.path.relpath() for them
+        prefix = os.path.join(self.specFilesPath, "")
+        if specFile.startswith(prefix):
+            relPath = specFile[len(prefix) :]  # noqa: E203
+        else:
+            relPath = os.path.relpath(specFile, self.specFilesPath)
+        name = hashlib.sha1(relPath.encode()).hexdigest()
+        return os.path.join(self.cacheDir, f"{name}.pickle")
+
+    # The content is hashed again only if inode, mtime or size of the file
+    # changed since it was last hashed
+    def getFileHash(self, path):
+        stat = os.stat(path)
+        statKey = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        fileHash = self.fileHashes.get(path)
+        if fileHash is None or fileHash[0] != statKey:
+            fileHash = (statKey, hashFile(path))
+            self.fileHashes[path] = fileHash
+        return fileHash[1]
+
+    """
+    Checks whether an entry recorded for given spec file, a dict with the
+    "specFile", its "hash" and the hashes of its "includes", is still
+    valid.
+    """
+
+    def isEntryValid(self, entry, specFile):
+        if entry.get("specFile") != specFile:
+            return False
+        try:
+            if entry.get("hash") != self.getFileHash(specFile):
+                return False
+            for includeFile, includeHash in entry["includes"].items():
+                if self.getFileHash(includeFile) != includeHash:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    """
+    Returns (buildarch, specObj, archDependent) tuple for given spec file
+    or None if there is no valid entry. specObj is None for skipped spec
+    files.
+    """
+
+    def get(self, specFile):
+        if not self.cacheDir:
+            return None
+        entry = None
+        try:
+            with open(self._getEntryPath(specFile), "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.debug(f"Ignoring broken cache entry {specFile}: {e}")
+
+        if entry is None or not self.isEntryValid(entry, specFile):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.mapSpecFileToIncludes[specFile] = list(entry["includes"])
+        return entry["parsedSpec"]
+
+    def put(self, specFile, parsedSpec, includedFiles):
+        self.mapSpecFileToIncludes[specFile] = includedFiles
+        if not self.cacheDir:
+            return
+        entry = {
+            "specFile": specFile,
+            "hash": self.getFileHash(specFile),
+            "includes": {f: self.getFileHash(f) for f in includedFiles},
+            "parsedSpec": parsedSpec,
+        }
+        entryPath = self._getEntryPath(specFile)
+        # write to a temporary file first so that concurrent builds never
+        # read a partially written entry
+        tmpPath = f"{entryPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, entryPath)
+
+    # Remove entries of spec files which do not exist anymore. Temporary
+    # files are left alone, they are being written by concurrent builds.
+    def prune(self, listSpecFiles):
+        if not self.cacheDir:
+            return
+        keep = {
+            os.path.basename(self._getEntryPath(f)) for f in listSpecFiles
+        }
+        for entry in os.listdir(self.cacheDir):
+            if entry in keep or entry.endswith(".tmp"):
+                continue
+            try:
+                os.remove(os.path.join(self.cacheDir, entry))
+            except FileNotFoundError:
+                # removed by a concurrent build
+                pass
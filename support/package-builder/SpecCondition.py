@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import re
+import operator
+
+from RpmVersion import evrKey
+
+TOKEN_PATTERN = re.compile(
+    r"""\s*(?:
+        (?P<op>==|!=|<=|>=|<|>|&&|\|\||!|\(|\))
+        |(?P<string>v?"[^"]*")
+        |(?P<word>(?:%\{[^}]*\}|%(?!\{)|[^\s=!<>&|()"%])+)
+    )""",
+    re.VERBOSE,
+)
+
+NUMBER_PATTERN = re.compile(r"-?[0-9]+")
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+class SpecCondition(object):
+    """
+    Compiled condition of a %if line.
+
+    Supported are integers, "strings", v"versions" (compared like rpm
+    does, see RpmVersion), the comparisons
+    ==, !=, <, >, <=, >=, the logical operators &&, || and ! and
+    parentheses. Macros in operands are expanded on every evaluation, so
+    a condition is compiled once and evaluated against whatever macros
+    are defined at that point of the spec file.
+
+    Conditions are compiled into nested closures taking the macro
+    expansion function, and cached by their text. Logical operators and
+    comparisons result in 0 or 1, like in rpm.
+    """
+
+    # map condition text to SpecCondition
+    compiled = {}
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        self.evaluateFn = self._parseOr()
+        if self.pos != len(self.tokens):
+            self._error(f"unexpected '{self.tokens[self.pos][1]}'")
+        self.tokens = None
+
+    @staticmethod
+    def get(text):
+        condition = SpecCondition.compiled.get(text)
+        if condition is None:
+            condition = SpecCondition(text)
+            SpecCondition.compiled[text] = condition
+        return condition
+
+    def evaluate(self, expandMacros):
+        return self._isTrue(self.evaluateFn(expandMacros))
+
+    def _error(self, message):
+        raise Exception(f"Bad condition '{self.text}': {message}")
+
+    def _tokenize(self, text):
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = TOKEN_PATTERN.match(text, pos)
+            if not match:
+                self._error(f"unexpected '{text[pos:].strip()}'")
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            pos = match.end()
+        return tokens
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None, None
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            self._error("unexpected end")
+        self.pos += 1
+        return token
+
+    @staticmethod
+    def _isTrue(value):
+        if isinstance(value, str):
+            return value != ""
+        return value != 0
+
+    def _parseOr(self):
+        left = self._parseAnd()
+        while self._peek() == ("op", "||"):
+            self.pos += 1
+            right = self._parseAnd()
+            left = self._makeOr(left, right)
+        return left
+
+    def _parseAnd(self):
+        left = self._parseNot()
+        while self._peek() == ("op", "&&"):
+            self.pos += 1
+            right = self._parseNot()
+            left = self._makeAnd(left, right)
+        return left
+
+    def _parseNot(self):
+        if self._peek() == ("op", "!"):
+            self.pos += 1
+            operand = self._parseNot()
+            return lambda expand: int(not self._isTrue(operand(expand)))
+        return self._parseComparison()
+
+    def _parseComparison(self):
+        left = self._parsePrimary()
+        kind, value = self._peek()
+        while kind == "op" and value in COMPARISONS:
+            self.pos += 1
+            right = self._parsePrimary()
+            left = self._makeComparison(COMPARISONS[value], left, right)
+            kind, value = self._peek()
+        return left
+
+    def _parsePrimary(self):
+        kind, value = self._next()
+        if kind == "op":
+            if value != "(":
+                self._error(f"unexpected '{value}'")
+            expression = self._parseOr()
+            if self._next() != ("op", ")"):
+                self._error("missing ')'")
+            return expression
+        if kind == "string":
+            if value.startswith("v"):
+                text = value[2:-1]
+                return lambda expand: evrKey(expand(text))
+            text = value[1:-1]
+            return lambda expand: expand(text)
+        return self._makeNumber(value)
+
+    def _makeNumber(self, word):
+        if NUMBER_PATTERN.fullmatch(word):
+            number = int(word)
+            return lambda expand: number
+
+        def evaluateNumber(expand):
+            value = expand(word)
+            if not NUMBER_PATTERN.fullmatch(value):
+                self._error(f"'{word}' expands to non-number '{value}'")
+            return int(value)
+
+        return evaluateNumber
+
+    def _makeOr(self, left, right):
+        def evaluateOr(expand):
+            return int(
+                self._isTrue(left(expand)) or self._isTrue(right(expand))
+            )
+
+        return evaluateOr
+
+    def _makeAnd(self, left, right):
+        def evaluateAnd(expand):
+            return int(
+                self._isTrue(left(expand)) and self._isTrue(right(expand))
+            )
+
+        return evaluateAnd
+
+    def _makeComparison(self, compare, left, right):
+        def evaluateComparison(expand):
+            leftValue = left(expand)
+            rightValue = right(expand)
+            if type(leftValue) is not type(rightValue):
+                self._error("comparison of different types")
+            return int(compare(leftValue, rightValue))
+
+        return evaluateComparison
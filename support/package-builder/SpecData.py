@@ -2,18 +2,91 @@
 
 import os
 import re
+import copy
+
+from concurrent.futures import ProcessPoolExecutor
 
 from Logger import Logger
 from constants import constants
 from StringUtils import StringUtils
-from distutilsversion import StrictVersion
-from distutilsversion import LooseVersion
+from RpmVersion import satisfies, versionKey
 from SpecParser import SpecParser
+from SpecCache import SpecCache
+from DependencyClosure import DependencyClosure
+from SpecIndex import SpecIndex
+
+
+# constants which SpecParser depends on, passed to the parse workers
+PARSE_CONSTANTS = ["userDefinedMacros", "buildOptions"]
+
+
+def _getParseConstants():
+    return {name: getattr(constants, name) for name in PARSE_CONSTANTS}
+
+
+def _initParseWorker(parseConstants):
+    for name, value in parseConstants.items():
+        setattr(constants, name, value)
+
+
+"""
+Returns (specFile, parsedSpec, includedFiles), where parsedSpec is a
+(buildarch, specObj, archDependent) tuple. specObj is None if the spec file
+is not built for given arch.
+"""
+
+
+def _parseSpecFile(specFile, arch):
+    spec = SpecParser(specFile, arch)
+    buildarch = spec.packages.get("default").buildarch
+    specObj = None
+    if buildarch == "noarch" or buildarch == arch:
+        specObj = spec.createSpecObject()
+    parsedSpec = (buildarch, specObj, spec.archDependent)
+    return specFile, parsedSpec, spec.includedFiles
+
+
+"""
+Derive the parsing result of an arch independent spec file for another
+arch. Only the buildarch of packages which do not have explicit BuildArch
+differs.
+"""
+
+
+def _retargetParsedSpec(parsedSpec, fromArch, toArch):
+    buildarch, specObj, archDependent = parsedSpec
+    if buildarch == fromArch:
+        buildarch = toArch
+    if specObj is not None:
+        specObj = copy.copy(specObj)
+        specObj.buildarch = {
+            pkg: toArch if pkgArch == fromArch else pkgArch
+            for pkg, pkgArch in specObj.buildarch.items()
+        }
+    return buildarch, specObj, archDependent
 
 
 class SpecData(object):
-    def __init__(self, arch, logPath, specFilesPath):
+    """
+    baseSpecData is an already loaded SpecData of another arch. Spec files
+    which it found to be arch independent are not parsed again.
+
+    If targetPackages is given and the spec index is available, only the
+    spec files in the dependency closure of these packages are loaded up
+    front. Other spec files are loaded when their packages are first
+    asked for, all of them when the whole list of packages is.
+    """
+
+    def __init__(
+        self,
+        arch,
+        logPath,
+        specFilesPath,
+        baseSpecData=None,
+        targetPackages=None,
+    ):
         self.arch = arch
+        self.baseSpecData = baseSpecData
         self.logger = Logger.getLogger("SpecData", logPath, constants.logLevel)
 
         # map default package name to list of SpecObjects. Usually it is just
@@ -28,21 +101,167 @@ class SpecData(object):
         # map spec file name to SpecObject
         self.mapSpecFileNameToSpecObj = {}
 
-        self._readSpecs(specFilesPath)
+        # map (package name, version) to SpecObject. Built once all spec
+        # files are read, for any package name of mapPackageToSpec.
+        self.mapPackageVersionToSpecObj = {}
+
+        # map (package name, compare, version) of a dependency to the
+        # version of the package it resolves to. Loading more spec files
+        # does not invalidate it, as all spec files providing a package
+        # name are loaded together.
+        self.mapDependencyToVersion = {}
+
+        # map full spec file name to parsing result of spec files which
+        # do not depend on the arch
+        self.mapArchIndependentSpecs = {}
+
+        # closures of the Requires of packages ("name-version")
+        self.requiresClosure = DependencyClosure(self.getRequiresForPkg)
+
+        # map package ("name-version") to its base package, for the
+        # packages of requires trees
+        self.mapPkgToBasePkg = {}
+
+        # map base package ("name-version") to the base packages which
+        # BuildRequire or Require any of its packages, and package to the
+        # packages which Require it. Built when first needed, from the spec
+        # files loaded at that point.
+        self.mapBasePkgToDependents = None
+        self.mapPkgToDependents = None
+
+        # map full spec file name to parsing result of all spec files
+        # loaded so far
+        self.mapParsedSpecs = {}
+
+        # map full spec file name to the files it %include's
+        self.mapSpecFileToIncludes = {}
+
+        # map full spec file name to content hashes of the spec file and of
+        # the files it %include's, as they were loaded
+        self.mapSpecFileToHashes = {}
+
+        self.specFilesPath = specFilesPath
+        self.specCache = SpecCache(arch, specFilesPath, self.logger)
+        self.listSpecFiles = sorted(self.getListSpecFiles(specFilesPath))
+        self.specIndex = SpecIndex(self.specCache, self.listSpecFiles)
+        self.allSpecsLoaded = False
+
+        if targetPackages is None or not self.specIndex.isAvailable():
+            self._loadAllSpecs()
+        else:
+            # spec files unknown to the index are read anyway, to know
+            # what they provide and require
+            self._loadSpecFiles(
+                self.specIndex.getMissingSpecFiles(self.listSpecFiles)
+            )
+            self._loadSpecFiles(
+                self.specIndex.getClosure(
+                    self.specIndex.getProviders(targetPackages)
+                )
+            )
+        self.specCache.prune(self.listSpecFiles)
+        self.specIndex.save()
+
+    def _loadAllSpecs(self):
+        if self.allSpecsLoaded:
+            return
+        self._loadSpecFiles(self.listSpecFiles)
+        self.allSpecsLoaded = True
+
+    # Load the spec files providing given package, along with their
+    # dependency closure, unless already loaded
+    def _loadPackage(self, package):
+        if self.allSpecsLoaded or package in self.mapPackageToSpec:
+            return
+        self._loadSpecFiles(
+            self.specIndex.getClosure(self.specIndex.getProviders([package]))
+        )
+
+    # Creates SpecObjects for given spec files which are not loaded yet and
+    # put them in internal mappings. Spec files which did not change since
+    # the previous run are taken from the spec cache instead of being
+    # parsed again.
+    def _loadSpecFiles(self, listSpecFiles):
+        listSpecFiles = [
+            f for f in listSpecFiles if f not in self.mapParsedSpecs
+        ]
+        if not listSpecFiles:
+            return
+
+        parsedSpecs = {}
+        listSpecFilesToParse = []
+        # spec files whose SpecObject shares its data with the base arch
+        setRetargetedSpecFiles = set()
+        for specFile in listSpecFiles:
+            parsedSpec = self._getParsedSpecFromBase(specFile)
+            if parsedSpec:
+                setRetargetedSpecFiles.add(specFile)
+                self.mapSpecFileToIncludes[specFile] = (
+                    self.baseSpecData.mapSpecFileToIncludes[specFile]
+                )
+                self.mapSpecFileToHashes[specFile] = (
+                    self.baseSpecData.mapSpecFileToHashes[specFile]
+                )
+            else:
+                parsedSpec = self.specCache.get(specFile)
+            if parsedSpec:
+                parsedSpecs[specFile] = parsedSpec
+            else:
+                listSpecFilesToParse.append(specFile)
+
+        for specFile, parsedSpec, includedFiles in self._parseSpecs(
+            listSpecFilesToParse
+        ):
+            self.specCache.put(specFile, parsedSpec, includedFiles)
+            parsedSpecs[specFile] = parsedSpec
+        self.mapSpecFileToIncludes.update(
+            self.specCache.mapSpecFileToIncludes
+        )
 
-    # Read all .spec files from the given folder including subfolders,
-    # creates corresponding SpecObjects and put them in internal mappings.
-    def _readSpecs(self, specFilesPath):
-        for specFile in self._getListSpecFiles(specFilesPath):
-            spec = SpecParser(specFile, self.arch)
+        for specFile, parsedSpec in parsedSpecs.items():
+            buildarch, specObj, archDependent = parsedSpec
+            if not archDependent:
+                self.mapArchIndependentSpecs[specFile] = parsedSpec
 
             # skip the specfile if buildarch differs
-            buildarch = spec.packages.get("default").buildarch
             if buildarch != "noarch" and buildarch != self.arch:
                 self.logger.debug(f"Skipping spec file: {specFile}")
+                specObj = None
+            elif specFile not in setRetargetedSpecFiles:
+                specObj.internNames()
+            includedFiles = self.mapSpecFileToIncludes[specFile]
+            if specFile not in setRetargetedSpecFiles:
+                self.mapSpecFileToHashes[specFile] = {
+                    f: self.specCache.getFileHash(f)
+                    for f in [specFile] + includedFiles
+                }
+            self.specIndex.put(specFile, specObj, includedFiles)
+        self.mapParsedSpecs.update(parsedSpecs)
+
+        self.logger.debug(
+            f"Spec cache: {self.specCache.hits} hits, "
+            f"{self.specCache.misses} misses"
+        )
+        self._mapSpecObjects()
+
+    # Rebuild the mappings in place from all spec files loaded so far, in
+    # the order of spec file names, whichever way and whenever they were
+    # loaded
+    def _mapSpecObjects(self):
+        self.mapSpecObjects.clear()
+        self.mapPackageToSpec.clear()
+        self.mapSpecFileNameToSpecObj.clear()
+        self.mapPackageVersionToSpecObj.clear()
+        self.mapBasePkgToDependents = None
+        self.mapPkgToDependents = None
+
+        for specFile in self.listSpecFiles:
+            parsedSpec = self.mapParsedSpecs.get(specFile)
+            if parsedSpec is None:
+                continue
+            buildarch, specObj, archDependent = parsedSpec
+            if buildarch != "noarch" and buildarch != self.arch:
                 continue
-
-            specObj = spec.createSpecObject()
 
             name = specObj.name
             for specPkg in specObj.listPackages:
@@ -62,42 +281,155 @@ class SpecData(object):
                     value, key=lambda x: self.compareVersions(x), reverse=True
                 )
 
-    def _getListSpecFiles(self, path):
+        # keep the first SpecObject of a version, like a scan of
+        # mapSpecObjects would find
+        for package, specName in self.mapPackageToSpec.items():
+            for specObj in self.mapSpecObjects.get(specName, []):
+                self.mapPackageVersionToSpecObj.setdefault(
+                    (package, specObj.version), specObj
+                )
+
+    """
+    Read again the spec files which were added, removed or changed since
+    they were loaded, including changes of the files they %include. A file
+    is considered changed if its inode, mtime or size and its content hash
+    differ. The mappings are updated in place.
+
+    Returns the sorted list of base packages ("name-version") which were
+    removed, changed or added.
+    """
+
+    def reload(self):
+        listSpecFiles = sorted(self.getListSpecFiles(self.specFilesPath))
+        setSpecFiles = set(listSpecFiles)
+
+        listChangedSpecFiles = [
+            specFile
+            for specFile, hashes in self.mapSpecFileToHashes.items()
+            if specFile not in setSpecFiles or self._haveFilesChanged(hashes)
+        ]
+        setInvalidated = set()
+        for specFile in listChangedSpecFiles:
+            setInvalidated.update(self._getBasePkgsOfSpecFile(specFile))
+            del self.mapParsedSpecs[specFile]
+            del self.mapSpecFileToHashes[specFile]
+            self.mapSpecFileToIncludes.pop(specFile, None)
+            self.mapArchIndependentSpecs.pop(specFile, None)
+        self.listSpecFiles = listSpecFiles
+        self.specIndex.removeInvalidEntries(listSpecFiles)
+
+        # spec files changed or added. If not all are loaded, only those
+        # the index does not know in their current state
+        if self.allSpecsLoaded:
+            listSpecFilesToLoad = [
+                f for f in listSpecFiles if f not in self.mapParsedSpecs
+            ]
+        else:
+            listSpecFilesToLoad = self.specIndex.getMissingSpecFiles(
+                listSpecFiles
+            )
+        self.mapDependencyToVersion.clear()
+        self.requiresClosure = DependencyClosure(self.getRequiresForPkg)
+        self.mapPkgToBasePkg.clear()
+        self._loadSpecFiles(listSpecFilesToLoad)
+        if not self.allSpecsLoaded:
+            # keep all spec files providing names of the loaded ones
+            self._loadSpecFiles(self.specIndex.getClosure(self.mapParsedSpecs))
+        self._mapSpecObjects()
+        for specFile in listSpecFilesToLoad:
+            setInvalidated.update(self._getBasePkgsOfSpecFile(specFile))
+
+        self.specCache.prune(self.listSpecFiles)
+        self.specIndex.save()
+        self.logger.debug(
+            f"Reload: {len(listChangedSpecFiles)} spec files changed or "
+            f"removed, {len(listSpecFilesToLoad)} read"
+        )
+        return sorted(setInvalidated)
+
+    def _haveFilesChanged(self, hashes):
+        try:
+            for path, fileHash in hashes.items():
+                if self.specCache.getFileHash(path) != fileHash:
+                    return True
+        except OSError:
+            return True
+        return False
+
+    def _getBasePkgsOfSpecFile(self, specFile):
+        buildarch, specObj, _ = self.mapParsedSpecs.get(
+            specFile, (None, None, None)
+        )
+        if specObj is None or buildarch not in ["noarch", self.arch]:
+            return []
+        return [f"{specObj.name}-{specObj.version}"]
+
+    def _getParsedSpecFromBase(self, specFile):
+        if self.baseSpecData is None:
+            return None
+        parsedSpec = self.baseSpecData.mapArchIndependentSpecs.get(specFile)
+        if parsedSpec is None:
+            return None
+        return _retargetParsedSpec(
+            parsedSpec, self.baseSpecData.arch, self.arch
+        )
+
+    """
+    Parse given spec files, in a pool of constants.specParseProcesses
+    processes if set. Results are returned in the order of listSpecFiles.
+    """
+
+    def _parseSpecs(self, listSpecFiles):
+        numProcesses = min(constants.specParseProcesses, len(listSpecFiles))
+        if numProcesses <= 1:
+            return [_parseSpecFile(f, self.arch) for f in listSpecFiles]
+
+        self.logger.debug(
+            f"Parsing {len(listSpecFiles)} spec files using "
+            f"{numProcesses} processes"
+        )
+        chunkSize = max(1, len(listSpecFiles) // (numProcesses * 4))
+        with ProcessPoolExecutor(
+            max_workers=numProcesses,
+            initializer=_initParseWorker,
+            initargs=(_getParseConstants(),),
+        ) as executor:
+            return list(
+                executor.map(
+                    _parseSpecFile,
+                    listSpecFiles,
+                    [self.arch] * len(listSpecFiles),
+                    chunksize=chunkSize,
+                )
+            )
+
+    @staticmethod
+    def getListSpecFiles(path):
         listSpecFiles = []
-        for dirEntry in os.listdir(path):
-            dirEntryPath = os.path.join(path, dirEntry)
-            if os.path.isfile(dirEntryPath) and dirEntryPath.endswith(".spec"):
-                listSpecFiles.append(dirEntryPath)
-            elif os.path.isdir(dirEntryPath):
-                listSpecFiles.extend(self._getListSpecFiles(dirEntryPath))
+        for dirEntry in os.scandir(path):
+            if dirEntry.is_file() and dirEntry.name.endswith(".spec"):
+                listSpecFiles.append(dirEntry.path)
+            elif dirEntry.is_dir():
+                listSpecFiles.extend(SpecData.getListSpecFiles(dirEntry.path))
         return listSpecFiles
 
     def _getProperVersion(self, depPkg):
         if depPkg.compare == "":
             return self.getHighestVersion(depPkg.package)
+        key = (depPkg.package, depPkg.compare, depPkg.version)
+        version = self.mapDependencyToVersion.get(key)
+        if version is None:
+            version = self._resolveProperVersion(depPkg)
+            self.mapDependencyToVersion[key] = version
+        return version
+
+    def _resolveProperVersion(self, depPkg):
         specObjs = self.getSpecObjects(depPkg.package)
         try:
             for obj in specObjs:
                 verrel = obj.version + "-" + obj.release
-                if depPkg.compare == ">=":
-                    if LooseVersion(verrel) >= LooseVersion(depPkg.version):
-                        return obj.version
-                elif depPkg.compare == "<=":
-                    if LooseVersion(verrel) <= LooseVersion(depPkg.version):
-                        return obj.version
-                elif depPkg.compare == "=":
-                    if LooseVersion(verrel) == LooseVersion(depPkg.version):
-                        return obj.version
-                    if LooseVersion(obj.version) == LooseVersion(
-                        depPkg.version
-                    ):
-                        return obj.version
-                elif depPkg.compare == "<":
-                    if LooseVersion(verrel) < LooseVersion(depPkg.version):
-                        return obj.version
-                elif depPkg.compare == ">":
-                    if LooseVersion(verrel) > LooseVersion(depPkg.version):
-                        return obj.version
+                if satisfies(verrel, depPkg.compare, depPkg.version):
+                    return obj.version
         except Exception as e:
             self.logger.error(
                 "Exception happened while searching for: "
@@ -122,10 +454,17 @@ class SpecData(object):
             + availableVersions
         )
 
-    def _getSpecObjField(self, package, version, field):
-        for specObj in self.getSpecObjects(package):
-            if specObj.version == version:
-                return field(specObj)
+    def _getSpecObj(self, package, version):
+        specObj = self.mapPackageVersionToSpecObj.get((package, version))
+        if specObj is not None:
+            return specObj
+        if not self.allSpecsLoaded:
+            self._loadPackage(package)
+            specObj = self.mapPackageVersionToSpecObj.get((package, version))
+            if specObj is not None:
+                return specObj
+        # raises for unknown package names
+        self.getSpecName(package)
         self.logger.error(
             "Could not find " + package + "-" + version + " package from specs"
         )
@@ -133,27 +472,21 @@ class SpecData(object):
 
     def getBuildRequiresForPackage(self, package, version):
         buildRequiresList = []
-        for pkg in self._getSpecObjField(
-            package, version, field=lambda x: x.buildRequires
-        ):
+        for pkg in self._getSpecObj(package, version).buildRequires:
             properVersion = self._getProperVersion(pkg)
             buildRequiresList.append(pkg.package + "-" + properVersion)
         return buildRequiresList
 
     def getExtraBuildRequiresForPackage(self, package, version):
         packages = []
-        for pkg in self._getSpecObjField(
-            package, version, field=lambda x: x.extraBuildRequires
-        ):
+        for pkg in self._getSpecObj(package, version).extraBuildRequires:
             # no version deps for publishrpms - use just name
             packages.append(pkg.package)
         return packages
 
     def getBuildRequiresNativeForPackage(self, package, version):
         packages = []
-        for pkg in self._getSpecObjField(
-            package, version, field=lambda x: x.buildRequiresNative
-        ):
+        for pkg in self._getSpecObj(package, version).buildRequiresNative:
             properVersion = self._getProperVersion(pkg)
             packages.append(pkg.package + "-" + properVersion)
         return packages
@@ -165,9 +498,7 @@ class SpecData(object):
     # Returns list of [ "pkg1-vers1", "pkg2-vers2",.. ]
     def getRequiresAllForPackage(self, package, version):
         requiresList = []
-        for pkg in self._getSpecObjField(
-            package, version, field=lambda x: x.installRequires
-        ):
+        for pkg in self._getSpecObj(package, version).installRequires:
             properVersion = self._getProperVersion(pkg)
             requiresList.append(pkg.package + "-" + properVersion)
         return requiresList
@@ -183,14 +514,12 @@ class SpecData(object):
     """
 
     def getRequiresTreeForPkg(self, pkg):
-        requires = self.getBuildRequiresForPkg(pkg) + self.getRequiresForPkg(
-            pkg
-        )
+        requires = self.getBuildRequiresForPkg(pkg)
+        requires += self.requiresClosure.getDependencies(pkg)
+        closure = 0
         for p in requires:
-            for pc in SPECS.getData().getRequiresForPkg(p):
-                if pc not in requires:
-                    requires.append(pc)
-        return requires
+            closure |= self.requiresClosure.getClosure(p)
+        return sorted(self.requiresClosure.getPackages(closure))
 
     """
     Similar to getRequiresTreeForPkg, but returns smaller list containing
@@ -199,28 +528,76 @@ class SpecData(object):
     """
 
     def getRequiresTreeOfBasePkgsForPkg(self, pkg):
-        result = []
-        requires = self.getRequiresTreeForPkg(pkg)
-        for p in requires:
-            bp = self.getBasePkg(p)
-            if bp not in result and bp != pkg:
-                result.append(bp)
-        return result
+        basePkgs = set()
+        for p in self.getRequiresTreeForPkg(pkg):
+            basePkgs.add(self._getMemoizedBasePkg(p))
+        basePkgs.discard(pkg)
+        return sorted(basePkgs)
+
+    def _getMemoizedBasePkg(self, pkg):
+        basePkg = self.mapPkgToBasePkg.get(pkg)
+        if basePkg is None:
+            basePkg = self.getBasePkg(pkg)
+            self.mapPkgToBasePkg[pkg] = basePkg
+        return basePkg
+
+    # Both maps list dependents in the order of mapSpecObjects, respectively
+    # mapPackageToSpec, and of the versions of each package
+    def _buildBasePkgToDependents(self):
+        mapBasePkgToDependents = {}
+        for package, listSpecObjs in self.mapSpecObjects.items():
+            for specObj in listSpecObjs:
+                basePkg = f"{package}-{specObj.version}"
+                requires = self.getBuildRequiresForPkg(basePkg)
+                requires += self.getRequiresAllForPkg(basePkg)
+                for requiredBasePkg in dict.fromkeys(
+                    self._getMemoizedBasePkg(p) for p in requires
+                ):
+                    mapBasePkgToDependents.setdefault(
+                        requiredBasePkg, []
+                    ).append(basePkg)
+        self.mapBasePkgToDependents = mapBasePkgToDependents
+
+    def _buildPkgToDependents(self):
+        mapPkgToDependents = {}
+        for package, specName in self.mapPackageToSpec.items():
+            for specObj in self.mapSpecObjects[specName]:
+                pkg = f"{package}-{specObj.version}"
+                for requiredPkg in dict.fromkeys(
+                    self.requiresClosure.getDependencies(pkg)
+                ):
+                    mapPkgToDependents.setdefault(requiredPkg, []).append(
+                        pkg
+                    )
+        self.mapPkgToDependents = mapPkgToDependents
+
+    """
+    Returns base packages which BuildRequire or Require any package of
+    given base package. Only the spec files loaded so far are searched,
+    see getListPackagesRequiring to load those of all dependents.
+    """
+
+    def getBasePkgsRequiring(self, basePkg):
+        if self.mapBasePkgToDependents is None:
+            self._buildBasePkgToDependents()
+        return self.mapBasePkgToDependents.get(basePkg, [])
+
+    # Returns packages which Require given package, like
+    # getBasePkgsRequiring only from the spec files loaded so far
+    def getPkgsRequiring(self, pkg):
+        if self.mapPkgToDependents is None:
+            self._buildPkgToDependents()
+        return self.mapPkgToDependents.get(pkg, [])
 
     def getRequiresForPackage(self, package, version):
         requiresList = []
-        for specObj in self.getSpecObjects(package):
-            if specObj.version == version:
-                if package in specObj.installRequiresPackages:
-                    requiresPackages = specObj.installRequiresPackages[package]
-                    for pkg in requiresPackages:
-                        properVersion = self._getProperVersion(pkg)
-                        requiresList.append(pkg.package + "-" + properVersion)
-                return requiresList
-        self.logger.error(
-            "Could not find " + package + "-" + version + " package from specs"
-        )
-        raise Exception("Invalid package: " + package + "-" + version)
+        specObj = self._getSpecObj(package, version)
+        if package in specObj.installRequiresPackages:
+            requiresPackages = specObj.installRequiresPackages[package]
+            for pkg in requiresPackages:
+                properVersion = self._getProperVersion(pkg)
+                requiresList.append(pkg.package + "-" + properVersion)
+        return requiresList
 
     def getRequiresForPkg(self, pkg):
         package, version = StringUtils.splitPackageNameAndVersion(pkg)
@@ -228,9 +605,9 @@ class SpecData(object):
 
     def getCheckBuildRequiresForPackage(self, package, version):
         checkBuildRequiresList = []
-        checkBuildRequiresPackages = self._getSpecObjField(
-            package, version, field=lambda x: x.checkBuildRequires
-        )
+        checkBuildRequiresPackages = self._getSpecObj(
+            package, version
+        ).checkBuildRequires
         for pkg in checkBuildRequiresPackages:
             properVersion = self._getProperVersion(pkg)
             checkBuildRequiresList.append(pkg.package + "-" + properVersion)
@@ -248,9 +625,7 @@ class SpecData(object):
         return listPkgName
 
     def getRelease(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.release
-        )
+        return self._getSpecObj(package, version).release
 
     def getVersions(self, package):
         versions = []
@@ -262,35 +637,23 @@ class SpecData(object):
         return self.getSpecObjects(package)[0].version
 
     def getBuildArch(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.buildarch[package]
-        )
+        return self._getSpecObj(package, version).buildarch[package]
 
     def getSpecFile(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.specFile
-        )
+        return self._getSpecObj(package, version).specFile
 
     def getPatches(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.listPatches
-        )
+        return self._getSpecObj(package, version).listPatches
 
     def getSources(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.listSources
-        )
+        return self._getSpecObj(package, version).listSources
 
     def getChecksum(self, package, version, source):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.checksums.get(source)
-        )
+        return self._getSpecObj(package, version).checksums.get(source)
 
     # returns list of package names (no versions)
     def getPackages(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.listPackages
-        )
+        return self._getSpecObj(package, version).listPackages
 
     def getPackagesForPkg(self, pkg):
         pkgs = []
@@ -300,15 +663,14 @@ class SpecData(object):
         return pkgs
 
     def getRPMPackages(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.listRPMPackages
-        )
+        return self._getSpecObj(package, version).listRPMPackages
 
     @staticmethod
     def compareVersions(p):
-        return StrictVersion(p.version)
+        return versionKey(p.version)
 
     def getSpecName(self, package):
+        self._loadPackage(package)
         if package in self.mapPackageToSpec:
             specName = self.mapPackageToSpec[package]
             if specName in self.mapSpecObjects:
@@ -317,6 +679,7 @@ class SpecData(object):
         raise Exception("Invalid package:" + package)
 
     def isRPMPackage(self, package):
+        self._loadPackage(package)
         if package in self.mapPackageToSpec:
             specName = self.mapPackageToSpec[package]
             if specName in self.mapSpecObjects:
@@ -324,30 +687,68 @@ class SpecData(object):
         return False
 
     def getSecurityHardeningOption(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.securityHardening
-        )
+        return self._getSpecObj(package, version).securityHardening
 
     def isCheckAvailable(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.isCheckAvailable
-        )
+        return self._getSpecObj(package, version).isCheckAvailable
 
     def getListPackages(self):
+        self._loadAllSpecs()
         return list(self.mapSpecObjects.keys())
 
+    # Returns SpecObject of given spec file name (without path) or None
+    def getSpecObjForSpecFile(self, specFileName):
+        if not self.allSpecsLoaded:
+            self._loadSpecFiles(
+                self.specIndex.getClosure(
+                    f
+                    for f in self.listSpecFiles
+                    if os.path.basename(f) == specFileName
+                )
+            )
+        return self.mapSpecFileNameToSpecObj.get(specFileName)
+
+    """
+    Returns names of packages (subpackages as well, if subpackages is set)
+    which require any of given packages, directly or, if transitive is
+    set, through other packages. This is a superset of the actual
+    dependents: version constraints are not taken into account.
+    Spec files of other packages are not loaded.
+    """
+
+    def getListPackagesRequiring(
+        self, listPackages, transitive=False, subpackages=False
+    ):
+        if self.allSpecsLoaded:
+            dependents = None
+        else:
+            specFiles = self.specIndex.getDependents(listPackages, transitive)
+            self._loadSpecFiles(self.specIndex.getClosure(specFiles))
+            dependents = {
+                self.mapParsedSpecs[f][1].name
+                for f in specFiles
+                if self.mapParsedSpecs[f][1] is not None
+            }
+        if subpackages:
+            return [
+                p
+                for p, specName in self.mapPackageToSpec.items()
+                if dependents is None or specName in dependents
+            ]
+        return [
+            p
+            for p in self.mapSpecObjects
+            if dependents is None or p in dependents
+        ]
+
     def getURL(self, package, version):
-        return self._getSpecObjField(package, version, field=lambda x: x.url)
+        return self._getSpecObj(package, version).url
 
     def getSourceURL(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.sourceurl
-        )
+        return self._getSpecObj(package, version).sourceurl
 
     def getLicense(self, package, version):
-        return self._getSpecObjField(
-            package, version, field=lambda x: x.license
-        )
+        return self._getSpecObj(package, version).license
 
     # Converts "glibc-devel-2.28" into "glibc-2.28"
     def getBasePkg(self, pkg):
@@ -391,6 +792,17 @@ class SpecData(object):
 class SPECS(object):
     __instance = None
     specData = {}
+    # packages to load the spec files of up front, all if None
+    targetPackages = None
+
+    """
+    Load only the spec files needed for given packages up front, the others
+    when first needed. Has to be called before the first getData().
+    """
+
+    @staticmethod
+    def setTargetPackages(listPackages):
+        SPECS.targetPackages = list(listPackages)
 
     @staticmethod
     def getData(arch=None):
@@ -410,7 +822,53 @@ class SPECS(object):
             SPECS.__instance = self
         self.initialize()
 
+    """
+    Pick up changes of the spec files since they were loaded, see
+    SpecData.reload(). Returns a map of arch to the base packages which
+    were invalidated. All spec files are read again if the kernel version
+    macros changed.
+    """
+
+    @staticmethod
+    def reload():
+        if SPECS.__instance is None:
+            SPECS()
+            return {}
+        return SPECS.__instance._reload()
+
+    def _reload(self):
+        userDefinedMacros = dict(constants.userDefinedMacros)
+        self._addKernelMacros()
+        if constants.userDefinedMacros == userDefinedMacros:
+            return {
+                arch: specData.reload()
+                for arch, specData in self.specData.items()
+            }
+
+        invalidated = {
+            arch: self._getBasePkgs(specData)
+            for arch, specData in self.specData.items()
+        }
+        self._loadSpecData()
+        for arch, specData in self.specData.items():
+            invalidated[arch] = sorted(
+                invalidated.get(arch, set()) | self._getBasePkgs(specData)
+            )
+        return invalidated
+
+    @staticmethod
+    def _getBasePkgs(specData):
+        return {
+            f"{name}-{specObj.version}"
+            for name, specObjs in specData.mapSpecObjects.items()
+            for specObj in specObjs
+        }
+
     def initialize(self):
+        self._addKernelMacros()
+        self._loadSpecData()
+
+    def _addKernelMacros(self):
         # Preparse some files
 
         # adding kernelversion rpm macro
@@ -440,12 +898,22 @@ class SPECS(object):
             kernelsubrelease = f".{kernelsubrelease}"
             constants.addMacro("kernelsubrelease", kernelsubrelease)
 
+    def _loadSpecData(self):
         # Full parsing
         self.specData[constants.buildArch] = SpecData(
-            constants.buildArch, constants.logPath, constants.specPath
+            constants.buildArch,
+            constants.logPath,
+            constants.specPath,
+            targetPackages=SPECS.targetPackages,
         )
 
+        # Spec files which do not depend on the arch are parsed only once
+        # for both archs
         if constants.buildArch != constants.targetArch:
             self.specData[constants.targetArch] = SpecData(
-                constants.targetArch, constants.logPath, constants.specPath
+                constants.targetArch,
+                constants.logPath,
+                constants.specPath,
+                baseSpecData=self.specData[constants.buildArch],
+                targetPackages=SPECS.targetPackages,
             )
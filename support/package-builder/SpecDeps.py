@@ -3,11 +3,11 @@
 import sys
 import os
 import json
-import queue
 import operator
 import shutil
 import traceback
 
+from collections import deque
 from SpecData import SPECS
 from constants import constants
 from CommandUtils import CommandUtils
@@ -26,34 +26,6 @@ class SpecDependencyGenerator(object):
             "SerializableSpecobjects", logPath, logLevel
         )
 
-    def findTotalRequires(self, mapDependencies, depQue, parent):
-        while not depQue.empty():
-            specPkg = depQue.get()
-            try:
-                listRequiredPackages = SPECS.getData().getRequiresForPkg(
-                    specPkg
-                )
-            except Exception as e:
-                self.logger.info(f"Caught Exception: {e}")
-                self.logger.info(f"{specPkg} is missing")
-                raise e
-
-            for depPkg in listRequiredPackages:
-                if depPkg in mapDependencies:
-                    if mapDependencies[depPkg] < mapDependencies[specPkg] + 1:
-                        mapDependencies[depPkg] = mapDependencies[specPkg] + 1
-                        parent[depPkg] = specPkg
-                        self.updateLevels(
-                            mapDependencies,
-                            depPkg,
-                            parent,
-                            mapDependencies[depPkg],
-                        )
-                else:
-                    mapDependencies[depPkg] = mapDependencies[specPkg] + 1
-                    parent[depPkg] = specPkg
-                    depQue.put(depPkg)
-
     def getBasePackagesRequired(self, pkg):
         listBasePackagesRequired = []
         listPackagesRequired = SPECS.getData().getBuildRequiresForPkg(pkg)
@@ -64,18 +36,20 @@ class SpecDependencyGenerator(object):
                 listBasePackagesRequired.append(basePkg)
         return listBasePackagesRequired
 
+    # Breadth-first walk over the reverse dependencies. The spec files of
+    # all packages which may need any package of depList must be loaded,
+    # see SpecData.getListPackagesRequiring
     def findTotalWhoNeeds(self, depList, whoNeeds):
+        specData = SPECS.getData()
+        setWhoNeeds = set(whoNeeds)
         while depList:
             pkg = depList.pop(0)
-            for depPackage in SPECS.getData().getListPackages():
-                for version in SPECS.getData().getVersions(depPackage):
-                    depBasePkg = f"{depPackage}-{version}"
-                    if depBasePkg in whoNeeds:
-                        continue
-                    if pkg in self.getBasePackagesRequired(depBasePkg):
-                        whoNeeds.append(depBasePkg)
-                        if depBasePkg not in depList:
-                            depList.append(depBasePkg)
+            for depBasePkg in specData.getBasePkgsRequiring(pkg):
+                if depBasePkg in setWhoNeeds:
+                    continue
+                whoNeeds.append(depBasePkg)
+                setWhoNeeds.add(depBasePkg)
+                depList.append(depBasePkg)
 
     def printTree(self, children, curParent, depth):
         if curParent in children:
@@ -93,35 +67,48 @@ class SpecDependencyGenerator(object):
 
             return packages
 
-    def updateLevels(self, mapDependencies, inPkg, parent, level):
-        listPackages = SPECS.getData().getPackagesForPkg(inPkg)
-        for depPkg in SPECS.getData().getRequiresForPkg(inPkg):
-            if depPkg in listPackages:
-                continue
-            if (
-                depPkg in mapDependencies
-                and mapDependencies[depPkg] < level + 1
-            ):
-                mapDependencies[depPkg] = level + 1
-                parent[depPkg] = inPkg
-                self.updateLevels(
-                    mapDependencies, depPkg, parent, mapDependencies[depPkg]
-                )
+    """
+    Fills mapDependencies with the install order levels of the packages
+    given packages require, directly or not, see
+    DependencyClosure.getLevels, in breadth-first order from given
+    packages. A package is listed in parent under the first package found
+    requiring it from the level below, or else under the package it was
+    found from.
+    """
 
     def calculateSpecDependency(self, inputPackages, mapDependencies, parent):
-        depQue = queue.Queue()
+        listPkgs = []
         for package in inputPackages:
             if SPECS.getData().isRPMPackage(package):
                 version = SPECS.getData().getHighestVersion(package)
-                pkg = f"{package}-{version}"
-                if pkg not in mapDependencies:
-                    mapDependencies[pkg] = 0
-                    parent[pkg] = ""
-                    depQue.put(pkg)
-                    self.findTotalRequires(mapDependencies, depQue, parent)
+                listPkgs.append(f"{package}-{version}")
             else:
                 self.logger.info(f"Could not find spec for: {package}")
 
+        requiresClosure = SPECS.getData().requiresClosure
+        levels = requiresClosure.getLevels(listPkgs)
+        # packages whose parent is at the level below
+        setLeveled = set()
+        for pkg in listPkgs:
+            if pkg in mapDependencies:
+                continue
+            mapDependencies[pkg] = levels[pkg]
+            parent[pkg] = ""
+            depQue = deque([pkg])
+            while depQue:
+                specPkg = depQue.popleft()
+                for depPkg in requiresClosure.getDependencies(specPkg):
+                    if depPkg not in mapDependencies:
+                        mapDependencies[depPkg] = levels[depPkg]
+                        parent[depPkg] = specPkg
+                        depQue.append(depPkg)
+                    if (
+                        depPkg not in setLeveled
+                        and levels[depPkg] == levels[specPkg] + 1
+                    ):
+                        setLeveled.add(depPkg)
+                        parent[depPkg] = specPkg
+
     def displayDependencies(
         self, displayOption, inputType, inputValue, allDeps, parent
     ):
@@ -167,6 +154,39 @@ class SpecDependencyGenerator(object):
 
         return sortedList
 
+    """
+    Writes the expanded package list of each given package list file,
+    like packages_minimal.json, to <name>_expanded.json in outputDir. Same
+    as process() with input type and display option "json" for each file.
+    The closures of all listed packages are computed up front and shared
+    by all files.
+    """
+
+    def expandPackageLists(self, listJsonFiles, outputDir):
+        mapJsonFileToPackages = {
+            jsonFile: self.getAllPackageNames(jsonFile)
+            for jsonFile in listJsonFiles
+        }
+        requiresClosure = SPECS.getData().requiresClosure
+        for packages in mapJsonFileToPackages.values():
+            for package in packages:
+                if SPECS.getData().isRPMPackage(package):
+                    version = SPECS.getData().getHighestVersion(package)
+                    requiresClosure.getClosure(f"{package}-{version}")
+
+        for jsonFile, packages in mapJsonFileToPackages.items():
+            mapDependencies = {}
+            parent = {}
+            self.calculateSpecDependency(packages, mapDependencies, parent)
+            outputFile = os.path.join(
+                outputDir,
+                os.path.splitext(os.path.basename(jsonFile))[0]
+                + "_expanded.json",
+            )
+            self.displayDependencies(
+                "json", "json", outputFile, mapDependencies, parent
+            )
+
     # Returns list of RPM names of all packages excluding src.rpm
     def listRPMfilenames(self, includeDebuginfoRPMs=False):
         output = []
@@ -234,26 +254,31 @@ class SpecDependencyGenerator(object):
             )
         elif inputType == "get-upward-deps":
             depList = []
+            listPackages = []
             for specFile in inputValue.split(":"):
-                if specFile in SPECS.getData().mapSpecFileNameToSpecObj:
-                    specObj = SPECS.getData().mapSpecFileNameToSpecObj[
-                        specFile
-                    ]
+                specObj = SPECS.getData().getSpecObjForSpecFile(specFile)
+                if specObj is not None:
                     whoNeedsList.append(f"{specObj.name}-{specObj.version}")
                     depList.append(f"{specObj.name}-{specObj.version}")
+                    listPackages.extend(specObj.listPackages)
+            # loads the spec files of all packages which may need them
+            SPECS.getData().getListPackagesRequiring(
+                listPackages, transitive=True
+            )
             self.findTotalWhoNeeds(depList, whoNeedsList)
             return whoNeedsList
 
         elif inputType == "who-needs":
-            for depPackage in SPECS.getData().mapPackageToSpec:
-                pkg = f"{inputValue}-" + SPECS.getData().getHighestVersion(
-                    inputValue
-                )
-                for version in SPECS.getData().getVersions(depPackage):
-                    depPkg = f"{depPackage}-{version}"
-                    self.logger.info(depPkg)
-                    if pkg in SPECS.getData().getRequiresForPkg(depPkg):
-                        whoNeedsList.append(depPkg)
+            pkg = f"{inputValue}-" + SPECS.getData().getHighestVersion(
+                inputValue
+            )
+            # loads the spec files of all packages which may need it
+            SPECS.getData().getListPackagesRequiring(
+                [inputValue], subpackages=True
+            )
+            for depPkg in SPECS.getData().getPkgsRequiring(pkg):
+                self.logger.info(depPkg)
+                whoNeedsList.append(depPkg)
             self.logger.info(whoNeedsList)
             return whoNeedsList
 
@@ -268,10 +293,8 @@ class SpecDependencyGenerator(object):
 
         elif inputType == "is-toolchain-pkg":
             for specFile in inputValue.split(":"):
-                if specFile in SPECS.getData().mapSpecFileNameToSpecObj:
-                    specObj = SPECS.getData().mapSpecFileNameToSpecObj[
-                        specFile
-                    ]
+                specObj = SPECS.getData().getSpecObjForSpecFile(specFile)
+                if specObj is not None:
                     if (
                         specObj.name in constants.listCoreToolChainPackages
                     ) or (specObj.name in constants.listToolChainPackages):
@@ -332,6 +355,12 @@ def main():
 
     if not options.input_data_dir.endswith("/"):
         options.input_data_dir += "/"
+
+    # queries about single packages only need their spec files
+    if options.input_type in ["pkg", "who-needs", "all-requires"]:
+        SPECS.setTargetPackages([options.pkg])
+    elif options.input_type == "print-upward-deps":
+        SPECS.setTargetPackages([])
     try:
         specDeps = SpecDependencyGenerator(options.log_path, options.log_level)
 
@@ -366,20 +395,11 @@ def main():
                     + "/build_install_options_all.json",
                     options.output_dir,
                 )
-            for json_file in list_json_files:
-                output_file = None
-                if options.display_option == "json":
-                    output_file = os.path.join(
-                        options.output_dir,
-                        os.path.splitext(os.path.basename(json_file))[0]
-                        + "_expanded.json",
-                    )
-                    specDeps.process(
-                        options.input_type,
-                        json_file,
-                        options.display_option,
-                        output_file,
-                    )
+            if options.display_option == "json":
+                specDeps.expandPackageLists(
+                    list_json_files, options.output_dir
+                )
+                for json_file in list_json_files:
                     shutil.copyfile(
                         json_file,
                         os.path.join(
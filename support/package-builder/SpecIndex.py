@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import os
+import json
+
+from constants import constants
+
+
+class SpecIndex(object):
+    """
+    Persisted index of the package names each spec file provides and of
+    the names of the packages it depends on (BuildRequires, native and
+    check BuildRequires and Requires), for one arch.
+
+    It allows SpecData to find the spec files in the dependency closure of
+    some packages without parsing all the others. Entries are validated
+    like the entries of the SpecCache it belongs to, by the content hashes
+    of the spec file and of its %include'd files.
+
+    Closures always contain all spec files providing a package name they
+    refer to, so that a SpecData loaded from a closure resolves these
+    names exactly like a fully loaded one.
+    """
+
+    def __init__(self, specCache, listSpecFiles):
+        self.specCache = specCache
+        self.indexPath = None
+        # map spec file to its entry
+        self.entries = {}
+        self.changed = False
+
+        # map package name to spec files providing it, respectively
+        # depending on it. Built when first needed.
+        self.mapPackageToProviders = None
+        self.mapPackageToDependents = None
+
+        if specCache.configDigest:
+            self.indexPath = os.path.join(
+                constants.buildCachePath,
+                "specindex",
+                f"{specCache.arch}-{specCache.configDigest}.json",
+            )
+            self._load(listSpecFiles)
+
+    def _load(self, listSpecFiles):
+        try:
+            with open(self.indexPath) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.specCache.logger.debug(f"Ignoring broken spec index: {e}")
+            return
+
+        self.entries = entries
+        self.removeInvalidEntries(listSpecFiles)
+
+    # Remove entries of spec files which are not in listSpecFiles anymore
+    # or which changed since they were recorded
+    def removeInvalidEntries(self, listSpecFiles):
+        entries = {}
+        for specFile in listSpecFiles:
+            entry = self.entries.get(specFile)
+            if entry and self.specCache.isEntryValid(entry, specFile):
+                entries[specFile] = entry
+        if len(entries) != len(self.entries):
+            self.entries = entries
+            self.mapPackageToProviders = None
+            self.mapPackageToDependents = None
+            self.changed = True
+
+    def isAvailable(self):
+        return self.indexPath is not None
+
+    # Returns spec files of listSpecFiles without a valid entry
+    def getMissingSpecFiles(self, listSpecFiles):
+        return [f for f in listSpecFiles if f not in self.entries]
+
+    """
+    Records package names provided and required by given spec file.
+    specObj is None if the spec file is not built for the arch.
+    """
+
+    def put(self, specFile, specObj, includedFiles):
+        if not self.indexPath or specFile in self.entries:
+            return
+        packages = []
+        requires = set()
+        if specObj is not None:
+            packages = specObj.listPackages
+            for dependencies in [
+                specObj.buildRequires,
+                specObj.buildRequiresNative,
+                specObj.checkBuildRequires,
+                specObj.installRequires,
+                *specObj.installRequiresPackages.values(),
+            ]:
+                requires.update(dep.package for dep in dependencies)
+        self.entries[specFile] = {
+            "specFile": specFile,
+            "hash": self.specCache.getFileHash(specFile),
+            "includes": {
+                f: self.specCache.getFileHash(f) for f in includedFiles
+            },
+            "packages": list(packages),
+            "requires": sorted(requires),
+        }
+        self.mapPackageToProviders = None
+        self.mapPackageToDependents = None
+        self.changed = True
+
+    def save(self):
+        if not self.indexPath or not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.indexPath), exist_ok=True)
+        tmpPath = f"{self.indexPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmpPath, self.indexPath)
+        self.changed = False
+
+    def _buildMaps(self):
+        self.mapPackageToProviders = {}
+        self.mapPackageToDependents = {}
+        for specFile, entry in self.entries.items():
+            for package in entry["packages"]:
+                self.mapPackageToProviders.setdefault(package, []).append(
+                    specFile
+                )
+            for package in entry["requires"]:
+                self.mapPackageToDependents.setdefault(package, []).append(
+                    specFile
+                )
+
+    def getProviders(self, listPackages):
+        if self.mapPackageToProviders is None:
+            self._buildMaps()
+        specFiles = set()
+        for package in listPackages:
+            specFiles.update(self.mapPackageToProviders.get(package, []))
+        return specFiles
+
+    """
+    Returns given spec files along with all spec files providing the
+    packages they provide or require, transitively.
+    """
+
+    def getClosure(self, listSpecFiles):
+        closure = set()
+        pending = list(listSpecFiles)
+        while pending:
+            specFile = pending.pop()
+            if specFile in closure:
+                continue
+            closure.add(specFile)
+            entry = self.entries.get(specFile)
+            if entry is None:
+                continue
+            for provider in self.getProviders(
+                entry["packages"] + entry["requires"]
+            ):
+                if provider not in closure:
+                    pending.append(provider)
+        return closure
+
+    """
+    Returns spec files requiring any of given packages. If transitive is
+    set, also the spec files requiring any package of these, and so on.
+    """
+
+    def getDependents(self, listPackages, transitive=False):
+        if self.mapPackageToDependents is None:
+            self._buildMaps()
+        dependents = set()
+        pending = list(listPackages)
+        seen = set(pending)
+        while pending:
+            package = pending.pop()
+            for specFile in self.mapPackageToDependents.get(package, []):
+                if specFile in dependents:
+                    continue
+                dependents.add(specFile)
+                if not transitive:
+                    continue
+                for p in self.entries[specFile]["packages"]:
+                    if p not in seen:
+                        seen.add(p)
+                        pending.append(p)
+        return dependents
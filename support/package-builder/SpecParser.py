@@ -5,13 +5,57 @@ import re
 
 from StringUtils import StringUtils
 from constants import constants
+from MacroEngine import MacroEngine
+from SpecCondition import SpecCondition
 from SpecStructures import dependentPackageData, Package, SpecObject
 
 strUtils = StringUtils()
 
+# Classifies a stripped line of a spec file in a single match. The kind
+# of line is the name of the matching group, alternatives are tried in
+# order.
+LINE_PATTERN = re.compile(
+    r"""
+    (?P<conditionalArch>%ifarch)
+    |(?P<ifCondition>%if[ ])
+    |(?P<specMacro>%(?:clean|prep|build|install|changelog|check))
+    |(?P<packageMacro>%(?:post|postun|files|description|package))
+    |(?P<packageHeader>(?i:
+        (?:summary|name|group|license|version|release|distribution
+        |requires|requires\((?:pre|post|preun|postun)\)
+        |provides|obsoletes|conflicts|url|source[0-9]*|patch[0-9]*
+        |buildrequires|buildprovides|buildarch):
+    ))
+    |(?P<globalSecurityHardening>(?i:%global[ ]*security_hardening))
+    |(?P<checksum>%define\s+(?:sha1|sha512)\s+\S*=[a-z0-9]+$)
+    |(?P<extraBuildRequires>(?i:%define[ ]*extrabuildrequires))
+    |(?P<buildRequiresNative>(?i:%define[ ]*buildrequiresnative))
+    |(?P<definition>%define|%global)
+    |(?P<conditionalCheckMacro>%if\s+\S*with_check\S*$)
+    |(?P<conditionalMacroEnd>%endif$)
+    |(?P<include>%include)
+    """,
+    re.VERBOSE,
+)
+
+# Matches lines (not stripped) which end the content of a section
+MACRO_PATTERN = re.compile(
+    r"\s*%(?:post|postun|files|description|package)"
+    r"|%(?:clean|prep|build|install|changelog|check|if)"
+    r"|\s*%endif\s*\Z"
+)
+
 
 class SpecParser(object):
     class rpmMacro(object):
+        __slots__ = [
+            "macroName",
+            "macroFlag",
+            "content",
+            "position",
+            "endposition",
+        ]
+
         def __init__(self):
             self.macroName = ""
             self.macroFlag = ""
@@ -19,8 +63,15 @@ class SpecParser(object):
             self.position = -1
             self.endposition = -1
 
-    def __init__(self, specfile, arch):
+    """
+    Section bodies (%build, %files, ...) are not needed to build the
+    SpecObject and are only kept in rpmMacro.content if keepSectionBodies
+    is set.
+    """
+
+    def __init__(self, specfile, arch, keepSectionBodies=False):
         self.arch = arch
+        self.keepSectionBodies = keepSectionBodies
         self.cleanMacro = None
         self.prepMacro = None
         self.buildMacro = None
@@ -28,18 +79,27 @@ class SpecParser(object):
         self.changelogMacro = None
         self.checkMacro = None
         self.packages = {}
-        self.specAdditionalContent = ""
+        # lines which are not parsed, joined on demand
+        self.additionalContent = []
         self.globalSecurityHardening = ""
-        self.defs = {}
-        self.defs["_arch"] = arch
+        self.macros = MacroEngine()
+        self.macros.define("_arch", arch)
         self.conditionalCheckMacroEnabled = False
-        self.macro_pattern = re.compile(r"%{(\S+?)\}")
         self.specfile = specfile
+        # files pulled in through %include, in order of inclusion
+        self.includedFiles = []
+        # set once the parsing result depends on the arch: %ifarch, the
+        # _arch macro or an explicit BuildArch other than noarch
+        self.archDependent = False
 
         self.packages["default"] = Package(self.arch)
         self.currentPkg = "default"
         self._parseSpecFile(self.specfile)
 
+    @property
+    def specAdditionalContent(self):
+        return "".join(f"{line}\n" for line in self.additionalContent)
+
     def _parseSpecFile(self, file):
         with open(file) as specFile:
             lines = specFile.readlines()
@@ -59,16 +119,19 @@ class SpecParser(object):
 
         while i < totalLines:
             line = lines[i].strip()
-            if self._isConditionalArch(line):
+            match = LINE_PATTERN.match(line)
+            kind = match.lastgroup if match else None
+            if kind == "conditionalArch":
+                self.archDependent = True
                 if self.arch != self._readConditionalArch(line):
                     skip_conditional_body(line)
-            elif self._isIfCondition(line):
+            elif kind == "ifCondition":
                 if not self._isConditionTrue(line, file):
                     skip_conditional_body(line)
-            elif self._isSpecMacro(line):
+            elif kind == "specMacro":
                 macro, i = self._readMacroFromFile(i, lines)
                 self._updateSpecMacro(macro)
-            elif self._isPackageMacro(line):
+            elif kind == "packageMacro":
                 defaultpkg = self.packages.get("default")
                 returnVal, packageName = self._readPkgNameFromPackageMacro(
                     line, defaultpkg.name
@@ -89,42 +152,43 @@ class SpecParser(object):
                         i += 1
                         continue
                     self.packages[packageName].updatePackageMacro(macro)
-            elif self._isPackageHeaders(line):
+            elif kind == "packageHeader":
                 self._readPackageHeaders(
                     line, self.packages[self.currentPkg]
                 )
-            elif self._isGlobalSecurityHardening(line):
+            elif kind == "globalSecurityHardening":
                 self._readSecurityHardening(line)
-            elif self._isChecksum(line):
+            elif kind == "checksum":
                 self._readChecksum(line, self.packages[self.currentPkg])
-            elif self._isExtraBuildRequires(line):
+            elif kind == "extraBuildRequires":
                 self._readExtraBuildRequires(
                     line, self.packages[self.currentPkg]
                 )
-            elif self._isBuildRequiresNative(line):
+            elif kind == "buildRequiresNative":
                 self._readBuildRequiresNative(
                     line, self.packages[self.currentPkg]
                 )
-            elif self._isDefinition(line):
+            elif kind == "definition":
                 self._readDefinition(line)
-            elif self._isConditionalCheckMacro(line):
+            elif kind == "conditionalCheckMacro":
                 self.conditionalCheckMacroEnabled = True
             elif (
-                self.conditionalCheckMacroEnabled
-                and self._isConditionalMacroEnd(line)
+                kind == "conditionalMacroEnd"
+                and self.conditionalCheckMacroEnabled
             ):
                 self.conditionalCheckMacroEnabled = False
-            elif self._isInclude(line):
+            elif kind == "include":
                 include = line.split()
                 if len(include) == 2:
                     includeFile = os.path.join(
                         os.path.dirname(file),
                         self._replaceMacros(include[1]),
                     )
+                    self.includedFiles.append(includeFile)
                     # recursive parsing
                     self._parseSpecFile(includeFile)
             else:
-                self.specAdditionalContent += f"{line}\n"
+                self.additionalContent.append(line)
             i += 1
 
     def _readPkgNameFromPackageMacro(self, data, basePkgName=None):
@@ -147,90 +211,10 @@ class SpecParser(object):
         return True, pkgName
 
     def _replaceMacros(self, string):
-        """
-        Replace all macros in given string with corresponding values.
-
-        For example: a string '%{name}-%{version}.tar.gz' will be
-        transformed to 'foo-2.0.tar.gz'.
-
-        :return A string where all macros in given input are substituted
-        as good as possible.
-        """
-
-        def _is_conditional(macro):
-            return macro.startswith(("?", "!"))
-
-        def _test_conditional(macro):
-            if macro[0] == "?":
-                return True
-            if macro[0] == "!":
-                return False
-            raise Exception("Given string is not a conditional macro")
-
-        def _is_macro_defined(macro):
-            return (
-                (macro in self.defs.keys())
-                or (macro in constants.userDefinedMacros.keys())
-                or (
-                    macro
-                    in constants.getAdditionalMacros(
-                        self.packages["default"].name
-                    ).keys()
-                )
-            )
-
-        def _get_macro(macro):
-            if macro in self.defs.keys():
-                return self.defs[macro]
-
-            if macro in constants.userDefinedMacros.keys():
-                return constants.userDefinedMacros[macro]
-
-            if (
-                macro
-                in constants.getAdditionalMacros(
-                    self.packages["default"].name
-                ).keys()
-            ):
-                return constants.getAdditionalMacros(
-                    self.packages["default"].name
-                )[macro]
-
-            raise Exception(f"Unknown macro: {macro}")
-
-        def _macro_repl(match):
-            macro_name = match.group(1)
-            if _is_conditional(macro_name):
-                parts = macro_name[1:].split(":")
-                assert parts
-                retv = ""
-                if _test_conditional(macro_name):
-                    if _is_macro_defined(parts[0]):
-                        if len(parts) == 2:
-                            retv = parts[1]
-                        else:
-                            retv = _get_macro(parts[0])
-                else:
-                    if not _is_macro_defined(parts[0]):
-                        if len(parts) == 2:
-                            retv = parts[1]
-                return retv
-
-            if _is_macro_defined(macro_name):
-                return _get_macro(macro_name)
-            return match.string[match.start() : match.end()]  # noqa: E203
-
-        # User macros
-        for macroName, value in constants.userDefinedMacros.items():
-            macro = f"%{macroName}"
-            if string.find(macro) != -1:
-                string = string.replace(macro, value)
-        # Spec definitions
-        for macroName, value in self.defs.items():
-            macro = f"%{macroName}"
-            if string.find(macro) != -1:
-                string = string.replace(macro, value)
-        return re.sub(self.macro_pattern, _macro_repl, string)
+        string = self.macros.expand(string)
+        if "_arch" in self.macros.referenced:
+            self.archDependent = True
+        return string
 
     def _readMacroFromFile(self, currentPos, lines):
         macro = self.rpmMacro()
@@ -255,7 +239,8 @@ class SpecParser(object):
             content = lines[j]
             if j + 1 < endPos and self._isMacro(lines[j + 1]):
                 return macro, j
-            macro.content += f"{content}\n"
+            if self.keepSectionBodies:
+                macro.content += f"{content}\n"
             macro.endposition = j
         return macro, endPos
 
@@ -274,75 +259,7 @@ class SpecParser(object):
             self.checkMacro = macro
 
     def _isMacro(self, line):
-        return (
-            self._isPackageMacro(line)
-            or self._isSpecMacro(line)
-            or self._isConditionalMacroStart(line)
-            or self._isConditionalMacroEnd(line)
-        )
-
-    def _isConditionalArch(self, line):
-        return re.search("^%ifarch", line)
-
-    def _isSpecMacro(self, line):
-        return line.startswith(
-            ("%clean", "%prep", "%build", "%install", "%changelog", "%check")
-        )
-
-    def _isPackageMacro(self, line):
-        line = line.strip()
-        return line.startswith(
-            ("%post", "%postun", "%files", "%description", "%package")
-        )
-
-    def _isPackageHeaders(self, line):
-        headersPatterns = [
-            "^summary:",
-            "^name:",
-            "^group:",
-            "^license:",
-            "^version:",
-            "^release:",
-            "^distribution:",
-            "^requires:",
-            r"^requires\((pre|post|preun|postun)\):",
-            "^provides:",
-            "^obsoletes:",
-            "^conflicts:",
-            "^url:",
-            "^source[0-9]*:",
-            "^patch[0-9]*:",
-            "^buildrequires:",
-            "^buildprovides:",
-            "^buildarch:",
-        ]
-        return any(
-            [re.search(r, line, flags=re.IGNORECASE) for r in headersPatterns]
-        )
-
-    def _isGlobalSecurityHardening(self, line):
-        return re.search(
-            "^%global *security_hardening", line, flags=re.IGNORECASE
-        )
-
-    def _isExtraBuildRequires(self, line):
-        return re.search(
-            "^%define *extrabuildrequires", line, flags=re.IGNORECASE
-        )
-
-    def _isBuildRequiresNative(self, line):
-        return re.search(
-            "^%define *buildrequiresnative", line, flags=re.IGNORECASE
-        )
-
-    def _isChecksum(self, line):
-        w = line.split()
-        if len(w) != 3 or w[0] != "%define" or w[1] not in {"sha1", "sha512"}:
-            return False
-        return re.match(".*=[a-z0-9]+$", w[2])
-
-    def _isDefinition(self, line):
-        return line.startswith(("%define", "%global"))
+        return MACRO_PATTERN.match(line) is not None
 
     def _readConditionalArch(self, line):
         w = line.split()
@@ -353,7 +270,9 @@ class SpecParser(object):
     def _readDefinition(self, line):
         listDefines = line.split()
         if len(listDefines) == 3:
-            self.defs[listDefines[1]] = self._replaceMacros(listDefines[2])
+            self.macros.define(
+                listDefines[1], self._replaceMacros(listDefines[2])
+            )
             return True
         return False
 
@@ -417,7 +336,8 @@ class SpecParser(object):
         if headerName == "name":
             pkg.name = headerContent
             if pkg == self.packages["default"]:
-                self.defs["name"] = pkg.name
+                self.macros.define("name", pkg.name)
+                self.macros.setPackageName(pkg.name)
             return True
         if headerName == "group":
             pkg.group = headerContent
@@ -428,15 +348,17 @@ class SpecParser(object):
         if headerName == "version":
             pkg.version = headerContent
             if pkg == self.packages["default"]:
-                self.defs["version"] = pkg.version
+                self.macros.define("version", pkg.version)
             return True
         if headerName == "buildarch":
             pkg.buildarch = headerContent
+            if headerContent != "noarch":
+                self.archDependent = True
             return True
         if headerName == "release":
             pkg.release = headerContent
             if pkg == self.packages["default"]:
-                self.defs["release"] = pkg.release
+                self.macros.define("release", pkg.release)
             return True
         if headerName == "distribution":
             pkg.distribution = headerContent
@@ -447,7 +369,7 @@ class SpecParser(object):
         if "source" in headerName:
             pkg.sources.append(headerContent)
             sourceNum = headerName[6:]
-            self.defs[f"SOURCE{sourceNum}"] = headerContent
+            self.macros.define(f"SOURCE{sourceNum}", headerContent)
             return True
         if "patch" in headerName:
             pkg.patches.append(headerContent)
@@ -549,40 +471,16 @@ class SpecParser(object):
         pkg.checksums[sourceName] = {words[1]: value[1]}
         return True
 
-    def _isConditionalCheckMacro(self, line):
-        data = line.strip()
-        words = data.split()
-        if len(words) != 2:
-            return False
-        if words[0] != "%if" or "with_check" not in words[1]:
-            return False
-        return True
-
-    def _isIfCondition(self, line):
-        return line.startswith("%if ")
-
     def _isConditionTrue(self, line, spec_fn):
-        words = line.strip().split()
+        words = line.strip().split(None, 1)
         if len(words) < 2:
             raise Exception(f"Bad if condition {line} in {spec_fn}")
 
-        cond = ""
-        for w in words[1:]:
-            if w in {"==", ">", ">=", "<", "<=", "!=", "||", "&&"}:
-                if w == "||":
-                    cond = f"{cond} or "
-                elif w == "&&":
-                    cond = f"{cond} and "
-                else:
-                    cond = f"{cond} {w} "
-            else:
-                val = self._replaceMacros(w).lstrip("0")
-                if not val:
-                    val = "0"
-                cond = f"{cond} {val}"
-
-        cond = f"({cond}) != 0"
-        return eval(cond)
+        try:
+            condition = SpecCondition.get(words[1])
+            return condition.evaluate(self._replaceMacros)
+        except Exception as e:
+            raise Exception(f"Bad if condition {line} in {spec_fn}: {e}")
 
     def _isConditionalMacroStart(self, line):
         return line.startswith("%if")
@@ -590,9 +488,6 @@ class SpecParser(object):
     def _isConditionalMacroEnd(self, line):
         return line.strip() == "%endif"
 
-    def _isInclude(self, line):
-        return line.startswith("%include")
-
     """
     SpecObject generating functions
     @requiresType: "build" for BuildRequires or
@@ -1,14 +1,67 @@
 #!/usr/bin/env python3
 
+import sys
+
+# These classes use __slots__ as thousands of instances are kept for each
+# arch in every build process.
+
+# map (package, compare, version) to the dependentPackageData shared by all
+# SpecObjects, see dependentPackageData.intern()
+internedDependencies = {}
+
 
 class dependentPackageData(object):
+    __slots__ = ["package", "version", "compare"]
+
     def __init__(self):
         self.package = ""
         self.version = ""
         self.compare = ""
 
+    # Returns the shared instance equal to this one. Must not be modified
+    # afterwards.
+    def intern(self):
+        key = (self.package, self.compare, self.version)
+        dependency = internedDependencies.get(key)
+        if dependency is None:
+            self.package = sys.intern(self.package)
+            self.version = sys.intern(self.version)
+            self.compare = sys.intern(self.compare)
+            dependency = internedDependencies.setdefault(key, self)
+        return dependency
+
 
 class Package(object):
+    __slots__ = [
+        "summary",
+        "name",
+        "group",
+        "license",
+        "version",
+        "release",
+        "buildarch",
+        "distribution",
+        "basePkgName",
+        "URL",
+        "sources",
+        "checksums",
+        "patches",
+        "buildrequires",
+        "buildprovides",
+        "checkbuildrequires",
+        "extrabuildrequires",
+        "buildrequiresnative",
+        "requires",
+        "provides",
+        "obsoletes",
+        "conflicts",
+        "descriptionMacro",
+        "postMacro",
+        "postunMacro",
+        "filesMacro",
+        "packageMacro",
+    ]
+
     def __init__(self, buildarch, basePkg=None):
         self.summary = ""
         self.name = ""
@@ -62,6 +115,30 @@ class Package(object):
 
 
 class SpecObject(object):
+    __slots__ = [
+        "name",
+        "version",
+        "release",
+        "buildarch",
+        "listPackages",
+        "listRPMPackages",
+        "buildRequires",
+        "installRequires",
+        "checkBuildRequires",
+        "extraBuildRequires",
+        "buildRequiresNative",
+        "installRequiresPackages",
+        "specFile",
+        "listSources",
+        "checksums",
+        "listPatches",
+        "securityHardening",
+        "isCheckAvailable",
+        "url",
+        "sourceurl",
+        "license",
+    ]
+
     def __init__(self):
         self.name = ""
         self.version = ""
@@ -95,6 +172,35 @@ class SpecObject(object):
         self.checksums = {}
         self.listPatches = []
         self.securityHardening = ""
+        self.isCheckAvailable = False
         self.url = ""
         self.sourceurl = ""
         self.license = ""
+
+    # Replace package names and dependencies by interned instances, so
+    # that SpecObjects share them instead of keeping a copy per reference
+    def internNames(self):
+        intern = sys.intern
+
+        def internDependencies(dependencies):
+            return [dependency.intern() for dependency in dependencies]
+
+        self.name = intern(self.name)
+        self.version = intern(self.version)
+        self.release = intern(self.release)
+        self.buildarch = {
+            intern(pkg): intern(arch) for pkg, arch in self.buildarch.items()
+        }
+        self.listPackages = [intern(pkg) for pkg in self.listPackages]
+        self.listRPMPackages = [intern(pkg) for pkg in self.listRPMPackages]
+        self.buildRequires = internDependencies(self.buildRequires)
+        self.installRequires = internDependencies(self.installRequires)
+        self.checkBuildRequires = internDependencies(self.checkBuildRequires)
+        self.extraBuildRequires = internDependencies(self.extraBuildRequires)
+        self.buildRequiresNative = internDependencies(
+            self.buildRequiresNative
+        )
+        self.installRequiresPackages = {
+            intern(pkg): internDependencies(requires)
+            for pkg, requires in self.installRequiresPackages.items()
+        }
@@ -4,10 +4,13 @@ import WorkerThread
 
 
 class ThreadPool(object):
+    """
+    Fixed pool of worker threads. Workers live until the scheduler has
+    nothing left for them: they block in
+    Scheduler.waitNextPackageToBuild() while no package is ready.
+    """
 
     mapWorkerThreads = {}
-    activeWorkerThreads = []
-    inactiveWorkerThreads = []
     mapPackageToCycle = {}
     pkgBuildType = "chroot"
     logger = None
@@ -16,8 +19,6 @@ class ThreadPool(object):
     @staticmethod
     def clear():
         ThreadPool.mapWorkerThreads.clear()
-        ThreadPool.activeWorkerThreads = []
-        ThreadPool.inactiveWorkerThreads = []
 
     @staticmethod
     def addWorkerThread(workerThreadName):
@@ -30,36 +31,38 @@ class ThreadPool(object):
         )
         ThreadPool.mapWorkerThreads[workerThreadName] = workerThread
 
-    @staticmethod
-    def makeWorkerThreadActive(threadName):
-        if threadName in ThreadPool.inactiveWorkerThreads:
-            ThreadPool.inactiveWorkerThreads.remove(threadName)
-        ThreadPool.activeWorkerThreads.append(threadName)
-
-    @staticmethod
-    def makeWorkerThreadInActive(threadName):
-        if threadName in ThreadPool.activeWorkerThreads:
-            ThreadPool.activeWorkerThreads.remove(threadName)
-        ThreadPool.inactiveWorkerThreads.append(threadName)
-
     @staticmethod
     def startWorkerThread(threadName):
         ThreadPool.mapWorkerThreads[threadName].start()
 
     @staticmethod
-    def getListInactiveWorkerThreads():
-        return ThreadPool.inactiveWorkerThreads
+    def join_all():
+        for p in ThreadPool.mapWorkerThreads.values():
+            p.join()
 
+    # Logs how long each worker spent building packages, relative to its
+    # lifetime
     @staticmethod
-    def activateWorkerThreads(numOfThreadsToActivate):
-        while ThreadPool.inactiveWorkerThreads and numOfThreadsToActivate > 0:
-            threadName = ThreadPool.inactiveWorkerThreads.pop()
-            ThreadPool.addWorkerThread(threadName)
-            ThreadPool.startWorkerThread(threadName)
-            ThreadPool.makeWorkerThreadActive(threadName)
-            numOfThreadsToActivate = numOfThreadsToActivate - 1
+    def logUtilization():
+        totalBusyTime = 0
+        totalTime = 0
+        for name, workerThread in ThreadPool.mapWorkerThreads.items():
+            busyTime = workerThread.busyTime
+            elapsedTime = workerThread.getElapsedTime()
+            totalBusyTime += busyTime
+            totalTime += elapsedTime
+            ThreadPool.logger.info(
+                f"{name}: {workerThread.numPackages} packages, busy "
+                f"{busyTime:.0f}s of {elapsedTime:.0f}s "
+                f"({ThreadPool._getPercentage(busyTime, elapsedTime)})"
+            )
+        ThreadPool.logger.info(
+            f"Worker utilization: "
+            f"{ThreadPool._getPercentage(totalBusyTime, totalTime)}"
+        )
 
     @staticmethod
-    def join_all():
-        for p in ThreadPool.mapWorkerThreads.values():
-            p.join()
+    def _getPercentage(part, total):
+        if not total:
+            return "n/a"
+        return f"{100 * part / total:.1f}%"
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
+import time
 import threading
 import Scheduler
-import ThreadPool
 
 from PackageBuilder import PackageBuilder
 
@@ -15,29 +15,51 @@ class WorkerThread(threading.Thread):
         self.mapPackageToCycle = mapPackageToCycle
         self.logger = logger
         self.pkgBuildType = pkgBuildType
+        # utilization of the worker
+        self.startTime = None
+        self.stopTime = None
+        self.busyTime = 0
+        self.numPackages = 0
 
     def run(self):
-        ThreadPool.ThreadPool.makeWorkerThreadActive(self.name)
+        self.startTime = time.monotonic()
         self.logger.debug(f"Thread {self.name} is starting now")
         while True:
-            pkg = Scheduler.Scheduler.getNextPackageToBuild()
-            doneList = Scheduler.Scheduler.getDoneList()
+            try:
+                pkg = Scheduler.Scheduler.waitNextPackageToBuild()
+            except Exception as e:
+                # stops the build instead of leaving it waiting forever
+                self.logger.exception(e)
+                self.statusEvent.set()
+                break
             if pkg is None:
                 break
-            pkgBuilder = PackageBuilder(
-                self.mapPackageToCycle, self.pkgBuildType
-            )
+            buildStartTime = time.monotonic()
             try:
-                pkgBuilder.build(pkg, doneList)
+                doneList = Scheduler.Scheduler.getDoneList()
+                numJobs = Scheduler.Scheduler.getNumBuildJobs(pkg)
+                pkgBuilder = PackageBuilder(
+                    self.mapPackageToCycle, self.pkgBuildType
+                )
+                pkgBuilder.build(pkg, doneList, numJobs)
             except Exception as e:
                 self.logger.exception(e)
                 Scheduler.Scheduler.notifyPackageBuildFailed(pkg)
                 self.logger.debug(
                     f"Thread {self.name} stopped building package: {pkg}"
                 )
-                self.statusEvent.set()
-                break
-            Scheduler.Scheduler.notifyPackageBuildCompleted(pkg)
+            else:
+                Scheduler.Scheduler.notifyPackageBuildCompleted(
+                    pkg, pkgBuilder.buildUsage
+                )
+            finally:
+                self.busyTime += time.monotonic() - buildStartTime
+                self.numPackages += 1
 
-        ThreadPool.ThreadPool.makeWorkerThreadInActive(self.name)
+        self.stopTime = time.monotonic()
         self.logger.debug(f"Thread {self.name} is going to rest")
+
+    def getElapsedTime(self):
+        if self.startTime is None:
+            return 0
+        return (self.stopTime or time.monotonic()) - self.startTime
@@ -38,6 +38,10 @@ class constants(object):
     acvpBuild = False
     testForceRPMS = []
     tmpDirPath = "/dev/shm"
+    # persistent cache of build data, disabled when empty
+    buildCachePath = ""
+    # number of processes parsing spec files, 0 or 1 parses serially
+    specParseProcesses = 0
     buildOptions = {}
     # will be extended later from listMakeCheckRPMPkgtoInstall
     listMakeCheckRPMPkgWithVersionstoInstall = None
@@ -51,6 +55,8 @@ class constants(object):
     buildSrcRpm = 0
     buildDbgInfoRpm = 0
     resume_build = False
+    # keep building the packages which do not depend on failed ones
+    keepGoing = False
     buildDbgInfoRpmList = []
     extraPackagesList = []
 
@@ -388,6 +394,14 @@ class constants(object):
     def setSpecPath(specPath):
         constants.specPath = specPath
 
+    @staticmethod
+    def setBuildCachePath(buildCachePath):
+        constants.buildCachePath = buildCachePath
+
+    @staticmethod
+    def setSpecParseProcesses(specParseProcesses):
+        constants.specParseProcesses = specParseProcesses
+
     @staticmethod
     def setSourcePath(sourcePath):
         constants.sourcePath = sourcePath
@@ -460,6 +474,10 @@ class constants(object):
     def setRpmCheckStopOnError(rpmCheckStopOnError):
         constants.rpmCheckStopOnError = rpmCheckStopOnError
 
+    @staticmethod
+    def setKeepGoing(keepGoing):
+        constants.keepGoing = keepGoing
+
     @staticmethod
     def setStartSchedulerServer(startSchedulerServer):
         constants.startSchedulerServer = startSchedulerServer